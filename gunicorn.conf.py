@@ -0,0 +1,16 @@
+# Gunicorn settings, picked up automatically from the working directory
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Threaded workers: a long streamed download (the transcript export zip)
+# occupies one thread while the worker's main loop keeps sending heartbeats.
+# With the default sync worker, the download blocks the whole worker and is
+# killed partway once it runs past `timeout`.
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+
+# Load Django once in the master and fork workers from it, so new workers
+# (and autoscaled containers) skip settings, app registry and URL loading.
+# Set GUNICORN_PRELOAD=False to go back to per-worker imports.
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
@@ -0,0 +1,255 @@
+import json
+import os
+import tarfile
+import threading
+import zipfile
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.validators import URLValidator
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+
+from .forms import TranscriptionForm
+from .models import ApiToken, Transcription, UserProfile, WebhookEndpoint
+from .transcription_service import process_transcription
+from .webhooks import check_webhook_url
+
+MAX_STATUS_IDS = 500
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+
+def api_token_required(view):
+    """Authenticate requests with an `Authorization: Bearer <token>` header"""
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not key:
+            return JsonResponse({'error': 'Missing bearer token'}, status=401)
+
+        token = (
+            ApiToken.objects.select_related('user')
+            .filter(key_hash=ApiToken.hash_key(key.strip()), user__is_active=True)
+            .first()
+        )
+        if token is None:
+            return JsonResponse({'error': 'Invalid token'}, status=401)
+
+        ApiToken.objects.filter(pk=token.pk).update(last_used_at=timezone.now())
+        request.user = token.user
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ArchiveTooLarge(ValueError):
+    """An archive unpacks to more bytes than the API accepts"""
+
+
+def _spool_member(name, source, size, max_bytes):
+    """Copy one archive member to a temporary upload file, chunk by chunk
+
+    The declared size is checked first, but it can lie, so the copy itself
+    stops as soon as more than max_bytes have been decompressed.
+    """
+    if size > max_bytes:
+        raise ArchiveTooLarge(f'{name} unpacks to more than {max_bytes} bytes')
+
+    upload = TemporaryUploadedFile(os.path.basename(name), 'application/octet-stream', size, None)
+    copied = 0
+    try:
+        while chunk := source.read(min(SPOOL_CHUNK_BYTES, max_bytes - copied + 1)):
+            copied += len(chunk)
+            if copied > max_bytes:
+                raise ArchiveTooLarge(f'{name} unpacks to more than {max_bytes} bytes')
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    upload.size = copied
+    upload.seek(0)
+    return upload
+
+
+def iter_archive_files(archive, max_total_bytes):
+    """Yield the media files in an uploaded zip or tar archive
+
+    Tar archives are read as a stream; zip archives need their central
+    directory but members are still decompressed one at a time. Each member
+    is limited to API_MAX_ARCHIVE_MEMBER_BYTES and all of them together to
+    max_total_bytes, so a small archive can't fill the disk.
+    """
+    remaining = max_total_bytes
+
+    def spool(member_name, source, size):
+        nonlocal remaining
+        limit = min(settings.API_MAX_ARCHIVE_MEMBER_BYTES, remaining)
+        upload = _spool_member(member_name, source, size, limit)
+        remaining -= upload.size
+        return upload
+
+    name = archive.name.lower()
+    if name.endswith('.zip'):
+        with zipfile.ZipFile(archive) as zip_file:
+            for info in zip_file.infolist():
+                if info.is_dir() or os.path.basename(info.filename).startswith('.'):
+                    continue
+                with zip_file.open(info) as source:
+                    yield spool(info.filename, source, info.file_size)
+    elif name.endswith(TAR_SUFFIXES):
+        with tarfile.open(fileobj=archive, mode='r|*') as tar_file:
+            for member in tar_file:
+                if not member.isfile() or os.path.basename(member.name).startswith('.'):
+                    continue
+                yield spool(member.name, tar_file.extractfile(member), member.size)
+    else:
+        raise ValueError(f'Unsupported archive type: {archive.name}')
+
+
+@api_token_required
+@require_POST
+def api_create_transcriptions(request):
+    """Create transcriptions for every file (or archive member) in one request
+
+    Batches are left pending for `manage.py run_transcription_worker`. In
+    'thread' mode only single-file requests are accepted, since every job
+    would otherwise run in a thread of this web process.
+    """
+    is_batch = len(request.FILES.getlist('files')) > 1 or bool(request.FILES.getlist('archive'))
+    if is_batch and settings.TRANSCRIPTION_BACKGROUND != 'worker':
+        return JsonResponse(
+            {'error': "Batch uploads need the transcription worker (TRANSCRIPTION_BACKGROUND='worker')"},
+            status=400
+        )
+
+    try:
+        api_key = request.user.userprofile.api_key
+    except UserProfile.DoesNotExist:
+        api_key = ''
+    if not api_key:
+        return JsonResponse({'error': 'Save an OpenAI API key in your profile first'}, status=400)
+
+    uploads = request.FILES.getlist('files')
+    max_files = settings.API_MAX_BATCH_FILES
+    transcriptions = []
+    rejected = []
+    spooled = []
+    archive_bytes_left = settings.API_MAX_ARCHIVE_TOTAL_BYTES
+
+    try:
+        for archive in request.FILES.getlist('archive'):
+            try:
+                for upload in iter_archive_files(archive, archive_bytes_left):
+                    spooled.append(upload)
+                    archive_bytes_left -= upload.size
+                    uploads.append(upload)
+                    if len(uploads) > max_files:
+                        break
+            except (ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+                rejected.append({'name': archive.name, 'errors': [str(e)]})
+
+        if len(uploads) > max_files:
+            return JsonResponse({'error': f'At most {max_files} files per request'}, status=400)
+
+        for upload in uploads:
+            form = TranscriptionForm(files={'video_file': upload})
+            if not form.is_valid():
+                rejected.append({'name': upload.name, 'errors': list(form.errors['video_file'])})
+                continue
+            transcription = form.save(commit=False)
+            transcription.api_key = api_key
+            transcription.user = request.user
+            transcriptions.append(transcription)
+
+        # One INSERT for the whole batch; FileField.pre_save stores each file
+        transcriptions = Transcription.objects.bulk_create(transcriptions)
+    finally:
+        for upload in spooled:
+            upload.close()
+
+    if transcriptions and settings.TRANSCRIPTION_BACKGROUND == 'thread':
+        # A single upload, started the same way as the web form does
+        threading.Thread(target=process_transcription, args=(transcriptions[0],)).start()
+
+    return JsonResponse({
+        'created': [
+            {
+                'id': transcription.id,
+                'name': os.path.basename(transcription.video_file.name),
+                'status_url': f"{reverse('api_transcription_status')}?ids={transcription.id}",
+            }
+            for transcription in transcriptions
+        ],
+        'rejected': rejected,
+    }, status=201 if transcriptions else 400)
+
+
+@api_token_required
+@require_GET
+def api_transcription_status(request):
+    """Status of many transcriptions at once: ?ids=1,2,3"""
+    try:
+        ids = [int(pk) for pk in request.GET.get('ids', '').split(',') if pk.strip()]
+    except ValueError:
+        return JsonResponse({'error': 'ids must be a comma-separated list of integers'}, status=400)
+    if not ids:
+        return JsonResponse({'error': 'Missing ids'}, status=400)
+    if len(ids) > MAX_STATUS_IDS:
+        return JsonResponse({'error': f'At most {MAX_STATUS_IDS} ids per request'}, status=400)
+
+    rows = Transcription.objects.filter(user=request.user, pk__in=ids).values(
+        'id', 'status', 'error_message', 'created_at', 'completed_at'
+    )
+    return JsonResponse({'transcriptions': list(rows)})
+
+
+def _webhook_json(endpoint, include_secret=False):
+    data = {
+        'id': endpoint.id,
+        'url': endpoint.url,
+        'is_active': endpoint.is_active,
+        'created_at': endpoint.created_at,
+    }
+    if include_secret:
+        data['secret'] = endpoint.secret
+    return data
+
+
+@api_token_required
+@require_http_methods(['GET', 'POST'])
+def api_webhooks(request):
+    """List webhook endpoints, or register one with {"url": "https://..."}"""
+    if request.method == 'GET':
+        endpoints = WebhookEndpoint.objects.filter(user=request.user).order_by('id')
+        return JsonResponse({'webhooks': [_webhook_json(endpoint) for endpoint in endpoints]})
+
+    try:
+        url = json.loads(request.body or b'{}').get('url', '')
+        URLValidator(schemes=['http', 'https'])(url)
+    except (ValueError, AttributeError, ValidationError):
+        return JsonResponse({'error': 'Body must be JSON with a valid http(s) "url"'}, status=400)
+
+    try:
+        check_webhook_url(url)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    endpoint = WebhookEndpoint.objects.create(user=request.user, url=url)
+    # The secret is only returned here; use it to verify X-Transcribio-Signature
+    return JsonResponse(_webhook_json(endpoint, include_secret=True), status=201)
+
+
+@api_token_required
+@require_http_methods(['DELETE'])
+def api_webhook_delete(request, pk):
+    """Remove a webhook endpoint and its undelivered events"""
+    deleted, _ = WebhookEndpoint.objects.filter(user=request.user, pk=pk).delete()
+    if not deleted:
+        return JsonResponse({'error': 'Not found'}, status=404)
+    return HttpResponse(status=204)
@@ -0,0 +1,211 @@
+"""asyncio variant of transcription_service, driven by run_transcription_worker
+
+One event loop multiplexes many jobs: OpenAI calls go through AsyncOpenAI,
+files are read by the client off the loop, ORM access uses Django's async
+methods or sync_to_async, and file splitting runs in a small process pool.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import django
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+
+from .models import Transcription, TranscriptSegments
+from .polish_cache import polish_cache_key, get_cached_polish, store_polish, evict_polish_cache
+from .search import update_search_index
+from .segments import SegmentColumns
+from .webhooks import enqueue_transcription_event
+from .usage import UsageMeter, record_usage
+from .transcription_service import (
+    POLISH_MODEL,
+    POLISH_PROMPT_VERSION,
+    WHISPER_MODEL,
+    chunk_size_for,
+    polish_messages,
+    split_file_into_chunks,
+    split_into_windows,
+)
+
+_cpu_pool = None
+
+
+def get_cpu_pool(max_workers=2):
+    """Bounded process pool for blocking, CPU/disk-heavy steps"""
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=max_workers, initializer=django.setup)
+    return _cpu_pool
+
+
+def _remove_chunks(file_chunks, file_path):
+    for chunk_path in file_chunks:
+        if chunk_path != file_path and os.path.exists(chunk_path):
+            os.remove(chunk_path)
+
+
+async def atranscribe_with_whisper(client, audio_path):
+    """Send audio to Whisper API and get raw transcript with segment timings"""
+    # A Path is read asynchronously by the client instead of blocking the loop
+    return await client.audio.transcriptions.create(
+        model=WHISPER_MODEL,
+        file=Path(audio_path),
+        response_format="verbose_json",
+        timestamp_granularities=["segment"]
+    )
+
+
+async def apolish_with_chatgpt(client, raw_transcript, polish_slots, meter=None):
+    """Polish window by window, reusing the polish cache like the sync path
+
+    polish_slots is a semaphore shared by all jobs of the worker; it bounds
+    how many chat completions are in flight at once.
+    """
+    windows = split_into_windows(raw_transcript)
+    keys = [
+        polish_cache_key(window, POLISH_MODEL, POLISH_PROMPT_VERSION)
+        for window in windows
+    ]
+    polished = await sync_to_async(get_cached_polish)(keys)
+
+    async def polish(window, key):
+        async with polish_slots:
+            response = await client.chat.completions.create(
+                model=POLISH_MODEL,
+                messages=polish_messages(window)
+            )
+        if meter is not None:
+            meter.add_chat(response)
+        polished[key] = response.choices[0].message.content
+        await sync_to_async(store_polish)(key, polished[key])
+
+    missing = {key: window for window, key in zip(windows, keys) if key not in polished}
+    if missing:
+        # Let every request finish so its tokens are metered, then re-raise
+        results = await asyncio.gather(
+            *(polish(window, key) for key, window in missing.items()),
+            return_exceptions=True
+        )
+        await sync_to_async(evict_polish_cache)()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    return "\n\n".join(polished[key] for key in keys)
+
+
+async def aprocess_transcription(transcription_obj, upload_slots, polish_slots):
+    """Process a Transcription object without blocking the event loop
+
+    upload_slots is a semaphore shared by all jobs of the worker; it bounds
+    how many chunks are held in memory and uploaded to Whisper at once.
+    polish_slots does the same for chat completions.
+    """
+    file_path = None
+    file_chunks = []
+    meter = UsageMeter()
+    api_key = transcription_obj.api_key  # Cleared on success, needed for the usage ledger
+    try:
+        transcription_obj.status = 'processing'
+        await transcription_obj.asave()
+
+        from openai import AsyncOpenAI
+
+        file_path = transcription_obj.video_file.path
+        client = AsyncOpenAI(api_key=transcription_obj.api_key)
+
+        loop = asyncio.get_running_loop()
+        file_chunks = await loop.run_in_executor(
+            get_cpu_pool(),
+            split_file_into_chunks,
+            file_path,
+            chunk_size_for(file_path),
+        )
+
+        async def transcribe(chunk_path):
+            async with upload_slots:
+                return await atranscribe_with_whisper(client, chunk_path)
+
+        # Chunks are independent, so transcribe them concurrently and apply
+        # the running time offsets afterwards, in order
+        results = await asyncio.gather(
+            *(transcribe(path) for path in file_chunks),
+            return_exceptions=True
+        )
+        # Meter every chunk Whisper billed for, even if another chunk failed
+        transcripts = [result for result in results if not isinstance(result, BaseException)]
+        for transcript in transcripts:
+            meter.add_transcription(WHISPER_MODEL, transcript)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        segments = SegmentColumns()
+        chunk_offset = 0.0
+        for transcript in transcripts:
+            segments.extend(transcript.segments or [], offset_seconds=chunk_offset)
+            chunk_offset += transcript.duration or 0.0
+
+        combined_raw_transcript = "\n\n".join(transcript.text for transcript in transcripts)
+        transcription_obj.raw_transcript = combined_raw_transcript
+        await transcription_obj.asave()
+
+        await TranscriptSegments.objects.aupdate_or_create(
+            transcription=transcription_obj,
+            defaults=segments.to_fields()
+        )
+
+        transcription_obj.polished_transcript = await apolish_with_chatgpt(
+            client,
+            combined_raw_transcript,
+            polish_slots,
+            meter
+        )
+
+        transcription_obj.status = 'completed'
+        transcription_obj.completed_at = timezone.now()
+        transcription_obj.api_key = ""  # Clear the API key for security
+        await transcription_obj.asave()
+        await sync_to_async(update_search_index)(transcription_obj)
+        await sync_to_async(enqueue_transcription_event)(transcription_obj)
+
+        await sync_to_async(transcription_obj.video_file.delete)(save=False)
+
+        return True
+
+    except Exception as e:
+        transcription_obj.status = 'failed'
+        transcription_obj.error_message = str(e)
+        await transcription_obj.asave()
+        await sync_to_async(enqueue_transcription_event)(transcription_obj)
+        return False
+
+    finally:
+        await asyncio.to_thread(_remove_chunks, file_chunks, file_path)
+
+        # Failed jobs are billed for the calls they made too
+        try:
+            await sync_to_async(record_usage)(transcription_obj, meter, api_key)
+        except Exception as e:
+            print(f"Could not record usage for transcription {transcription_obj.id}: {e}")
+
+
+async def claim_pending_jobs(limit):
+    """Atomically move up to limit pending jobs to processing and return them
+
+    The conditional update makes it safe to run several workers.
+    """
+    claimed = []
+    pending_ids = [
+        pk async for pk in Transcription.objects
+        .filter(status='pending')
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:limit]
+    ]
+    for pk in pending_ids:
+        updated = await Transcription.objects.filter(pk=pk, status='pending').aupdate(status='processing')
+        if updated:
+            claimed.append(await Transcription.objects.aget(pk=pk))
+    return claimed
@@ -0,0 +1,107 @@
+import io
+import zipfile
+
+from .models import Transcription
+
+EXPORT_FORMATS = ('txt', 'xlsx')
+TEXT_PIECE_CHARS = 256 * 1024
+XLSX_CELL_CHARS = 32000  # Excel refuses cells over 32,767 characters
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only, unseekable sink that hands written bytes to a generator
+
+    zipfile detects that it can't seek and writes data descriptors after
+    each entry instead, so the archive never has to be rewound.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _write_text(archive, name, text):
+    """Write a text entry piece by piece, yielding compressed output as it goes"""
+    with archive.open(name, 'w') as entry:
+        for start in range(0, len(text), TEXT_PIECE_CHARS):
+            entry.write(text[start:start + TEXT_PIECE_CHARS].encode('utf-8'))
+            yield
+
+
+def _xlsx_bytes(transcription):
+    """One workbook per transcript: a sheet per version, a paragraph per row
+
+    Unlike the text entries, this isn't purely in memory: openpyxl spools
+    each sheet to a temporary file until the workbook is saved, and removes
+    it right after. Only one transcript's sheets exist at a time.
+    """
+    from openpyxl import Workbook  # Only needed when XLSX is requested
+
+    workbook = Workbook(write_only=True)
+    for title, text in (
+        ('Polished', transcription.polished_transcript),
+        ('Raw', transcription.raw_transcript),
+    ):
+        sheet = workbook.create_sheet(title)
+        for paragraph in text.split("\n\n"):
+            paragraph = paragraph.strip()
+            for start in range(0, len(paragraph), XLSX_CELL_CHARS):
+                sheet.append([paragraph[start:start + XLSX_CELL_CHARS]])
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+
+def export_queryset(user):
+    """Completed transcripts of a user, loading only the exported columns"""
+    return (
+        Transcription.objects
+        .filter(user=user, status='completed')
+        .only('id', 'raw_transcript', 'polished_transcript')
+        .order_by('id')
+    )
+
+
+def iter_transcripts_zip(transcriptions, formats=('txt',)):
+    """Stream a zip archive of the given transcriptions, skipping empty writes"""
+    return (data for data in _iter_zip_chunks(transcriptions, formats) if data)
+
+
+def _iter_zip_chunks(transcriptions, formats):
+    """Yield the archive bytes as they are produced
+
+    Rows are fetched with a chunked DB iterator and every entry is compressed
+    as it is written, so memory stays flat no matter how many transcripts
+    are exported.
+    """
+    sink = _ZipStream()
+    # Level 1 trades a little ratio for much less CPU; text still shrinks ~3x
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for transcription in transcriptions.iterator(chunk_size=100):
+            pk = transcription.pk
+            if 'txt' in formats:
+                for name, text in (
+                    (f"transcript_raw_{pk}.txt", transcription.raw_transcript),
+                    (f"transcript_polished_{pk}.txt", transcription.polished_transcript),
+                ):
+                    for _ in _write_text(archive, name, text):
+                        yield sink.drain()
+            if 'xlsx' in formats:
+                with archive.open(f"transcript_{pk}.xlsx", 'w') as entry:
+                    entry.write(_xlsx_bytes(transcription))
+                yield sink.drain()
+
+    # Central directory, written when the archive closes
+    yield sink.drain()
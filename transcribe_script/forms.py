@@ -1,6 +1,7 @@
 from django import forms
 from .models import Transcription
 from .models import UserProfile
+from .media_probe import read_header, sniff_container, probe_media, check_probe
 
 
 class TranscriptionForm(forms.ModelForm):
@@ -20,6 +21,23 @@ class TranscriptionForm(forms.ModelForm):
             'video_file': 'Supports: MP4, MP3, WAV, M4A, WebM, MPEG, MKV (max 100MB)'  
         }
 
+    def clean_video_file(self):
+        """Sniff and probe the upload so bad files are rejected right away"""
+        video_file = self.cleaned_data['video_file']
+        # The extension can lie, so check the magic bytes too
+        self.container = sniff_container(read_header(video_file))
+        if self.container is None:
+            raise forms.ValidationError(
+                'This file does not look like audio or video. It may be corrupt or renamed.'
+            )
+        self.probe = probe_media(video_file)
+        check_probe(self.probe)
+        return video_file
+
+    def save(self, commit=True):
+        self.instance.apply_probe(self.container, self.probe)
+        return super().save(commit=commit)
+
 class UserProfileForm(forms.ModelForm):
     class Meta:
         model = UserProfile
@@ -0,0 +1,31 @@
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.core.management.base import BaseCommand
+
+from transcribe_script.webhooks import dispatch_due_events
+
+
+class Command(BaseCommand):
+    help = "Deliver queued webhook events, batched per endpoint, with retries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls; events arriving in between are batched")
+        parser.add_argument('--once', action='store_true', help="Deliver what is due and exit")
+
+    def handle(self, *args, **options):
+        # One pooled session keeps connections to each endpoint alive
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = 'Transcribio-Webhooks/1.0'
+
+        while True:
+            delivered, failed = dispatch_due_events(session)
+            if delivered or failed:
+                self.stdout.write(f"Delivered {delivered} events, {failed} failed")
+            if options['once']:
+                break
+            time.sleep(options['interval'])
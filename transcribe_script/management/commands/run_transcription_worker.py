@@ -0,0 +1,46 @@
+import asyncio
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from transcribe_script.async_service import aprocess_transcription, claim_pending_jobs, get_cpu_pool
+
+
+class Command(BaseCommand):
+    help = "Process pending transcriptions concurrently on a single asyncio event loop"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=200, help="Maximum jobs in flight")
+        parser.add_argument('--uploads', type=int, default=16, help="Maximum chunks uploading to Whisper at once")
+        parser.add_argument('--polish', type=int, default=8, help="Maximum polish requests to ChatGPT at once")
+        parser.add_argument('--cpu-workers', type=int, default=2, help="Processes for file splitting")
+        parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between checks for new jobs")
+        parser.add_argument('--once', action='store_true', help="Exit when no jobs are left")
+
+    def handle(self, *args, **options):
+        # With 'thread', the web process already starts every job itself
+        if settings.TRANSCRIPTION_BACKGROUND != 'worker':
+            raise CommandError(
+                "TRANSCRIPTION_BACKGROUND must be 'worker' to run the transcription worker "
+                f"(currently {settings.TRANSCRIPTION_BACKGROUND!r})."
+            )
+        get_cpu_pool(options['cpu_workers'])
+        asyncio.run(self.run(options))
+
+    async def run(self, options):
+        upload_slots = asyncio.Semaphore(options['uploads'])
+        polish_slots = asyncio.Semaphore(options['polish'])
+        running = set()
+
+        while True:
+            free = options['concurrency'] - len(running)
+            if free > 0:
+                for transcription in await claim_pending_jobs(free):
+                    task = asyncio.create_task(aprocess_transcription(transcription, upload_slots, polish_slots))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                    self.stdout.write(f"Started transcription {transcription.id}")
+
+            if options['once'] and not running:
+                break
+            await asyncio.sleep(options['poll_interval'])
@@ -0,0 +1,93 @@
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules a web worker should not import until a request actually needs them
+HEAVY_MODULES = ['openai', 'requests', 'moviepy', 'pydub', 'openpyxl', 'bs4']
+
+# Runs in a fresh interpreter so nothing is already imported or cached
+PROBE_SCRIPT = """
+import io, json, sys, time
+start = time.perf_counter()
+from transcribio.wsgi import application
+imported = time.perf_counter()
+
+status = []
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'HTTP_HOST': sys.argv[2],
+    'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+    'wsgi.version': (1, 0), 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+    'wsgi.run_once': False,
+}
+body = b''.join(application(environ, lambda s, h, e=None: status.append(s)))
+finished = time.perf_counter()
+
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'first_request_ms': (finished - imported) * 1000,
+    'status': status[0] if status else None,
+    'heavy_modules': [name for name in json.loads(sys.argv[3]) if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start cost of a web worker: app import time and first-request latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/accounts/login/', help="URL for the first request")
+        parser.add_argument('--max-import-ms', type=float, help="Fail if the median import time is above this")
+        parser.add_argument('--max-first-request-ms', type=float, help="Fail if the median first request is above this")
+        parser.add_argument('--allow-heavy', action='store_true', help="Don't fail when heavy modules are imported at startup")
+        parser.add_argument('--output', help="Append the result as a JSON line to this file")
+
+    def handle(self, *args, **options):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+        runs = []
+        for _ in range(options['runs']):
+            result = subprocess.run(
+                [sys.executable, '-c', PROBE_SCRIPT, options['path'], host, json.dumps(HEAVY_MODULES)],
+                capture_output=True,
+                text=True,
+                cwd=settings.BASE_DIR,
+            )
+            if result.returncode != 0:
+                raise CommandError(f"Startup probe failed:\n{result.stderr}")
+            runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+        summary = {
+            'timestamp': int(time.time()),
+            'runs': len(runs),
+            'path': options['path'],
+            'status': runs[-1]['status'],
+            'import_ms': round(statistics.median(run['import_ms'] for run in runs), 1),
+            'first_request_ms': round(statistics.median(run['first_request_ms'] for run in runs), 1),
+            'heavy_modules': runs[-1]['heavy_modules'],
+        }
+
+        self.stdout.write(
+            f"import: {summary['import_ms']} ms, first request ({summary['status']}): "
+            f"{summary['first_request_ms']} ms, heavy modules: {', '.join(summary['heavy_modules']) or 'none'}"
+        )
+        if options['output']:
+            with open(options['output'], 'a') as output:
+                output.write(json.dumps(summary) + "\n")
+
+        problems = []
+        if options['max_import_ms'] and summary['import_ms'] > options['max_import_ms']:
+            problems.append(f"import took {summary['import_ms']} ms (budget {options['max_import_ms']} ms)")
+        if options['max_first_request_ms'] and summary['first_request_ms'] > options['max_first_request_ms']:
+            problems.append(
+                f"first request took {summary['first_request_ms']} ms (budget {options['max_first_request_ms']} ms)"
+            )
+        if summary['heavy_modules'] and not options['allow_heavy']:
+            problems.append(f"heavy modules imported at startup: {', '.join(summary['heavy_modules'])}")
+        if problems:
+            raise CommandError("Cold-start regression: " + "; ".join(problems))
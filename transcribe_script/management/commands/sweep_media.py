@@ -0,0 +1,154 @@
+import os
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from transcribe_script.models import Transcription
+from transcribe_script.polish_cache import expire_polish_cache
+from transcribe_script.webhooks import enqueue_transcription_event
+
+UPLOAD_DIR = 'videos'
+CHUNK_PATTERN = re.compile(r'^(?P<base>.+)_chunk_\d+(?P<ext>\.[^.]*)?$')
+ACTIVE_STATUSES = ('pending', 'processing')
+
+
+class Command(BaseCommand):
+    help = "Remove orphaned chunks and uploads, enforce media retention for failed and stale jobs, and expire the polish cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be removed without deleting")
+        parser.add_argument('--failed-days', type=float, default=7, help="Keep uploads of failed jobs this many days")
+        parser.add_argument('--stale-hours', type=float, default=24, help="Fail pending/processing jobs older than this")
+        parser.add_argument(
+            '--polish-cache-days', type=float, default=settings.POLISH_CACHE_TTL_DAYS,
+            help="Drop polish cache entries unused for this many days"
+        )
+        parser.add_argument('--grace-minutes', type=float, default=60, help="Never touch files modified more recently than this")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', type=int, default=0, metavar='SECONDS', help="Keep sweeping, sleeping this long between runs")
+
+    def handle(self, *args, **options):
+        while True:
+            stats = self.sweep(options)
+            self.stdout.write(
+                f"Removed {stats['files']} files ({stats['bytes'] / (1024 * 1024):.1f} MB), "
+                f"expired {stats['failed']} failed and {stats['stale']} stale jobs, "
+                f"dropped {stats['polish_cache']} polish cache entries"
+                + (" [dry run]" if options['dry_run'] else "")
+            )
+            if not options['loop']:
+                break
+            time.sleep(options['loop'])
+
+    def sweep(self, options):
+        stats = {'files': 0, 'bytes': 0, 'failed': 0, 'stale': 0, 'polish_cache': 0}
+        now = timezone.now()
+
+        stats['stale'] = self.expire_stale_jobs(now - timedelta(hours=options['stale_hours']), options['dry_run'])
+        stats['polish_cache'] = expire_polish_cache(
+            now - timedelta(days=options['polish_cache_days']), options['dry_run']
+        )
+
+        upload_root = os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR)
+        if not os.path.isdir(upload_root):
+            return stats
+
+        newest_allowed = time.time() - options['grace_minutes'] * 60
+        failed_cutoff = now - timedelta(days=options['failed_days'])
+
+        batch = []
+        with os.scandir(upload_root) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > newest_allowed:
+                    continue
+                batch.append((entry.name, entry.path, stat.st_size))
+                if len(batch) >= options['batch_size']:
+                    self.sweep_batch(batch, failed_cutoff, options['dry_run'], stats)
+                    batch = []
+        if batch:
+            self.sweep_batch(batch, failed_cutoff, options['dry_run'], stats)
+
+        return stats
+
+    def expire_stale_jobs(self, cutoff, dry_run):
+        """Jobs stuck pending/processing (e.g. the worker died) are marked failed"""
+        stale = Transcription.objects.filter(status__in=ACTIVE_STATUSES, created_at__lt=cutoff)
+        if dry_run:
+            return stale.count()
+
+        stale_ids = list(stale.values_list('pk', flat=True))
+        error_message = "Processing timed out. Please upload the file again."
+        expired = Transcription.objects.filter(pk__in=stale_ids, status__in=ACTIVE_STATUSES).update(
+            status='failed',
+            error_message=error_message,
+            api_key="",
+        )
+
+        # Tell the owners' webhooks, as the pipeline does for other failures
+        for transcription in Transcription.objects.filter(
+            pk__in=stale_ids, status='failed', error_message=error_message
+        ):
+            enqueue_transcription_event(transcription)
+        return expired
+
+    def sweep_batch(self, batch, failed_cutoff, dry_run, stats):
+        """Decide which files of one scandir batch can go, with one query"""
+        names = set()
+        for name, _, _ in batch:
+            names.add(f"{UPLOAD_DIR}/{name}")
+            match = CHUNK_PATTERN.match(name)
+            if match:
+                names.add(f"{UPLOAD_DIR}/{match.group('base')}{match.group('ext') or ''}")
+
+        jobs = {
+            video_file: (pk, status, created_at)
+            for pk, video_file, status, created_at in Transcription.objects
+            .filter(video_file__in=names)
+            .values_list('pk', 'video_file', 'status', 'created_at')
+        }
+
+        expired_jobs = set()
+        for name, path, size in batch:
+            job = jobs.get(f"{UPLOAD_DIR}/{name}")
+            # Only treat the file as a chunk if it isn't itself an upload
+            match = CHUNK_PATTERN.match(name) if job is None else None
+            if match:
+                job = jobs.get(f"{UPLOAD_DIR}/{match.group('base')}{match.group('ext') or ''}")
+
+            if job is None:
+                # Upload or chunk with no Transcription row
+                remove = True
+            elif match:
+                # Chunks are only needed while their job is running
+                remove = job[1] not in ACTIVE_STATUSES
+            elif job[1] == 'completed':
+                # Normally deleted on success; leftovers come from a failed delete
+                remove = True
+            elif job[1] == 'failed':
+                remove = job[2] < failed_cutoff
+                if remove:
+                    expired_jobs.add(job[0])
+            else:
+                remove = False
+
+            if not remove:
+                continue
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            stats['files'] += 1
+            stats['bytes'] += size
+
+        if expired_jobs:
+            stats['failed'] += len(expired_jobs)
+            if not dry_run:
+                Transcription.objects.filter(pk__in=expired_jobs).update(video_file='')
@@ -0,0 +1,108 @@
+import json
+import shutil
+import subprocess
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+SNIFF_BYTES = 4096
+PROBE_TIMEOUT_SECONDS = 15
+DEFAULT_MAX_DURATION_SECONDS = 4 * 60 * 60
+
+
+def read_header(file, size=SNIFF_BYTES):
+    """Read the first bytes of an uploaded file without moving its position"""
+    position = file.tell() if hasattr(file, 'tell') else 0
+    file.seek(0)
+    header = file.read(size)
+    file.seek(position)
+    return header
+
+
+def sniff_container(header):
+    """Identify the container from its magic bytes, or None if unknown"""
+    if len(header) >= 12 and header[4:8] == b'ftyp':
+        return 'mp4'
+    if header[:4] == b'\x1a\x45\xdf\xa3':
+        return 'matroska'
+    if header[:4] == b'RIFF' and header[8:12] == b'WAVE':
+        return 'wav'
+    if header[:4] in (b'\x00\x00\x01\xba', b'\x00\x00\x01\xb3'):
+        return 'mpeg'
+    if len(header) > 188 and header[0] == 0x47 and header[188] == 0x47:
+        return 'mpegts'
+
+    # MP3: ID3 tag or an MPEG audio frame sync, possibly after zero padding
+    stripped = header.lstrip(b'\x00')
+    if stripped[:3] == b'ID3':
+        return 'mp3'
+    if len(stripped) >= 2 and stripped[0] == 0xFF and stripped[1] & 0xE0 == 0xE0:
+        return 'mp3'
+
+    return None
+
+
+def probe_media(file):
+    """Read container metadata with ffprobe, without decoding the media
+
+    Returns a dict with duration, audio stream presence, audio codec and
+    bitrate, or None when ffprobe is not installed.
+    """
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe is None:
+        return None
+
+    command = [
+        ffprobe, '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams',
+    ]
+    if hasattr(file, 'temporary_file_path'):
+        # Large uploads are already on disk, let ffprobe seek in place
+        command += ['-i', file.temporary_file_path()]
+        stdin = None
+    else:
+        command += ['-i', 'pipe:0']
+        file.seek(0)
+        stdin = file.read()
+        file.seek(0)
+
+    try:
+        result = subprocess.run(
+            command,
+            input=stdin,
+            capture_output=True,
+            timeout=PROBE_TIMEOUT_SECONDS,
+        )
+    except subprocess.TimeoutExpired:
+        raise ValidationError('Could not read this media file in time. Please try a different file.')
+
+    if result.returncode != 0:
+        raise ValidationError('This file could not be read as audio or video. It may be corrupt.')
+
+    info = json.loads(result.stdout or b'{}')
+    container = info.get('format', {})
+    audio_streams = [s for s in info.get('streams', []) if s.get('codec_type') == 'audio']
+
+    duration = container.get('duration')
+    bitrate = container.get('bit_rate')
+    return {
+        'duration': float(duration) if duration else None,
+        'has_audio': bool(audio_streams),
+        'audio_codec': audio_streams[0].get('codec_name', '') if audio_streams else '',
+        'bitrate': int(bitrate) if bitrate else None,
+    }
+
+
+def check_probe(probe):
+    """Reject uploads that would only fail later in the pipeline"""
+    if probe is None:
+        return
+    if not probe['has_audio']:
+        raise ValidationError('This file has no audio track, so there is nothing to transcribe.')
+
+    max_duration = getattr(settings, 'MAX_MEDIA_DURATION_SECONDS', DEFAULT_MAX_DURATION_SECONDS)
+    if probe['duration'] and probe['duration'] > max_duration:
+        raise ValidationError(
+            f'This file is {probe["duration"] / 3600:.1f} hours long. '
+            f'The maximum is {max_duration / 3600:.1f} hours.'
+        )
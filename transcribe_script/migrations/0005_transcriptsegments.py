@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcribe_script', '0004_transcription_user_alter_transcription_api_key_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptSegments',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('starts', models.BinaryField(help_text='Segment start times (uint32 ms)')),
+                ('ends', models.BinaryField(help_text='Segment end times (uint32 ms)')),
+                ('offsets', models.BinaryField(help_text='Text offsets of each segment (uint32)')),
+                ('text', models.TextField(blank=True)),
+                ('transcription', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='transcribe_script.transcription')),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:14
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    """GIN index and backfill for existing transcripts (PostgreSQL only)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS transcription_search_vector_gin "
+        "ON transcribe_script_transcription USING gin (search_vector)"
+    )
+    schema_editor.execute(
+        "UPDATE transcribe_script_transcription SET search_vector = "
+        "setweight(to_tsvector('simple', coalesce(polished_transcript, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(raw_transcript, '')), 'B') "
+        "WHERE status = 'completed'"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS transcription_search_vector_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcribe_script', '0005_transcriptsegments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
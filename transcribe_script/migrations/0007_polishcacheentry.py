@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcribe_script', '0006_transcription_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolishCacheEntry',
+            fields=[
+                ('key', models.CharField(help_text='sha256 of window, model and prompt version', max_length=64, primary_key=True, serialize=False)),
+                ('polished_text', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcribe_script', '0007_polishcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='audio_codec',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='bitrate',
+            field=models.PositiveIntegerField(blank=True, help_text='Bits per second', null=True),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='container',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='duration_seconds',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transcription',
+            name='has_audio',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+    ]
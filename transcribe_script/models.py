@@ -1,6 +1,10 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
+import hashlib
+import secrets
 from encrypted_model_fields.fields import EncryptedCharField
 
 
@@ -15,6 +19,11 @@ def validate_video_file(file):
         )
 
 
+def generate_webhook_secret():
+    """Random signing key for new webhook endpoints"""
+    return secrets.token_hex(32)
+
+
 class Transcription(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     video_file = models.FileField(
@@ -32,13 +41,163 @@ class Transcription(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     error_message = models.TextField(blank=True)
+
+    # Media metadata probed at upload time (empty if ffprobe is unavailable)
+    container = models.CharField(max_length=32, blank=True)
+    duration_seconds = models.FloatField(null=True, blank=True)
+    has_audio = models.BooleanField(null=True, blank=True)
+    audio_codec = models.CharField(max_length=32, blank=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, help_text="Bits per second")
+
+    # Full-text search (PostgreSQL only, GIN-indexed in migration 0006)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     def __str__(self):
         return f"Transcription {self.id} - {self.status}"
-    
+
+    def apply_probe(self, container, probe):
+        """Store upload-time media metadata (see media_probe.py)"""
+        self.container = container or ''
+        if probe:
+            self.duration_seconds = probe['duration']
+            self.has_audio = probe['has_audio']
+            self.audio_codec = probe['audio_codec']
+            self.bitrate = probe['bitrate']
+
+
+class TranscriptSegments(models.Model):
+    """Timestamped segments of a transcript, stored column-wise (see segments.py)"""
+    transcription = models.OneToOneField(
+        Transcription,
+        on_delete=models.CASCADE,
+        related_name='segments'
+    )
+    starts = models.BinaryField(help_text="Segment start times (uint32 ms)")
+    ends = models.BinaryField(help_text="Segment end times (uint32 ms)")
+    offsets = models.BinaryField(help_text="Text offsets of each segment (uint32)")
+    text = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Segments for transcription {self.transcription_id}"
+
+
+class PolishCacheEntry(models.Model):
+    """Polished output for one transcript window (see polish_cache.py)
+
+    Entries are shared between jobs, so they are not deleted with a
+    transcription or account; they are evicted by LRU size and by the
+    POLISH_CACHE_TTL_DAYS sweep in `manage.py sweep_media`.
+    """
+    key = models.CharField(max_length=64, primary_key=True, help_text="sha256 of window, model and prompt version")
+    polished_text = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Polish cache {self.key[:12]}"
+
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     api_key = EncryptedCharField(max_length=200, blank=True)
     
     def __str__(self):
-        return f"{self.user.username}'s profile"
\ No newline at end of file
+        return f"{self.user.username}'s profile"
+
+
+class ApiToken(models.Model):
+    """Bearer token for the JSON API. Only a hash of the token is stored."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100, blank=True)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def issue(cls, user, name=''):
+        """Create a token and return it with the raw key (shown only once)"""
+        key = secrets.token_urlsafe(32)
+        token = cls.objects.create(user=user, name=name, key_hash=cls.hash_key(key))
+        return token, key
+
+    def __str__(self):
+        return f"API token {self.name or self.id} for {self.user.username}"
+
+
+class WebhookEndpoint(models.Model):
+    """URL that receives signed job events (see webhooks.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='webhook_endpoints')
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64, default=generate_webhook_secret, help_text="HMAC-SHA256 signing key")
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Webhook {self.url} for {self.user.username}"
+
+
+class WebhookEvent(models.Model):
+    """A pending or delivered event for one endpoint"""
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='events')
+    event = models.CharField(max_length=50)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Dispatcher polls for undelivered events that are due
+            models.Index(fields=['delivered_at', 'next_attempt_at'], name='webhook_event_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event} for {self.endpoint_id} ({'delivered' if self.delivered_at else 'pending'})"
+
+
+class UsageRecord(models.Model):
+    """Append-only ledger of API usage, one row per job and API (see usage.py)"""
+    KIND_CHOICES = [
+        ('transcription', 'Whisper transcription'),
+        ('chat', 'Chat polishing'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='usage_records')
+    transcription = models.ForeignKey(Transcription, on_delete=models.SET_NULL, null=True, related_name='usage_records')
+    key_hint = models.CharField(max_length=8, blank=True, help_text="Last characters of the OpenAI key used")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    model = models.CharField(max_length=50)
+    audio_seconds = models.FloatField(default=0)
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} usage for transcription {self.transcription_id}"
+
+
+class UsageDaily(models.Model):
+    """Per user, key and day totals of UsageRecord, updated as rows are added"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='usage_daily')
+    day = models.DateField()
+    key_hint = models.CharField(max_length=8, blank=True)
+    jobs = models.PositiveIntegerField(default=0)
+    audio_seconds = models.FloatField(default=0)
+    prompt_tokens = models.PositiveBigIntegerField(default=0)
+    completion_tokens = models.PositiveBigIntegerField(default=0)
+    cost_usd = models.DecimalField(max_digits=14, decimal_places=6, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'key_hint'], name='usage_daily_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} usage on {self.day}"
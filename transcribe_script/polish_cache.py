@@ -0,0 +1,61 @@
+import hashlib
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PolishCacheEntry
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def polish_cache_key(window_text, model, prompt_version):
+    """Hash of everything that determines the polished output of a window"""
+    digest = hashlib.sha256()
+    for part in (model, str(prompt_version), window_text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def get_cached_polish(keys):
+    """Return {key: polished_text} for the keys already in the cache
+
+    Hits are marked as recently used so LRU eviction keeps them.
+    """
+    entries = dict(
+        PolishCacheEntry.objects.filter(key__in=keys).values_list('key', 'polished_text')
+    )
+    if entries:
+        PolishCacheEntry.objects.filter(key__in=list(entries)).update(last_used=timezone.now())
+    return entries
+
+
+def store_polish(key, polished_text):
+    """Save the polished text of a window"""
+    PolishCacheEntry.objects.update_or_create(
+        key=key,
+        defaults={'polished_text': polished_text, 'last_used': timezone.now()}
+    )
+
+
+def evict_polish_cache(max_entries=None):
+    """Drop least recently used entries beyond the configured size"""
+    if max_entries is None:
+        max_entries = getattr(settings, 'POLISH_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    # Runs after every polish, so the overflow is at most one job's windows
+    stale_keys = list(
+        PolishCacheEntry.objects.order_by('-last_used', 'key')
+        .values_list('key', flat=True)[max_entries:]
+    )
+    if stale_keys:
+        PolishCacheEntry.objects.filter(key__in=stale_keys).delete()
+
+
+def expire_polish_cache(cutoff, dry_run=False):
+    """Drop entries not used since cutoff; returns how many there were"""
+    expired = PolishCacheEntry.objects.filter(last_used__lt=cutoff)
+    if dry_run:
+        return expired.count()
+    deleted, _ = expired.delete()
+    return deleted
@@ -0,0 +1,132 @@
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import connection
+from django.db.models import Case, F, Q, Value, When
+from django.utils.html import escape
+
+from .models import Transcription
+
+# Transcripts keep the language of the source audio, so we can't pick a
+# stemming dictionary per row. 'simple' lowercases and tokenizes only.
+SEARCH_CONFIG = 'simple'
+SNIPPET_CHARS = 200
+
+# Snippets are returned as HTML: transcript text is always escaped and the
+# only markup is <mark>…</mark> around matches. Postgres highlights with
+# control-character sentinels, which are swapped for <mark> after escaping.
+MARK_START = '\x02'
+MARK_STOP = '\x03'
+
+
+def uses_postgres_search():
+    """Full-text indexing is only available on PostgreSQL"""
+    return connection.vendor == 'postgresql'
+
+
+def transcript_search_vector():
+    """Weighted tsvector: polished text ranks above raw Whisper output"""
+    return (
+        SearchVector('polished_transcript', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('raw_transcript', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_index(transcription):
+    """Refresh the search vector of a single transcription in the database"""
+    if not uses_postgres_search():
+        return
+    Transcription.objects.filter(pk=transcription.pk).update(
+        search_vector=transcript_search_vector()
+    )
+
+
+def _highlighted_html(snippet):
+    """Escape a sentinel-highlighted snippet and turn the sentinels into <mark>"""
+    return (
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_STOP, '</mark>')
+    )
+
+
+def _headline(field, search_query):
+    return SearchHeadline(
+        field,
+        search_query,
+        config=SEARCH_CONFIG,
+        start_sel=MARK_START,
+        stop_sel=MARK_STOP,
+        max_words=35,
+        min_words=15,
+    )
+
+
+def _plain_snippet(text, query):
+    """Cut a snippet around the first match (SQLite fallback)"""
+    text = text.replace(MARK_START, '').replace(MARK_STOP, '')
+    position = text.lower().find(query.lower())
+    if position < 0:
+        return _highlighted_html(text[:SNIPPET_CHARS])
+    start = max(0, position - SNIPPET_CHARS // 2)
+    end = position + len(query)
+    snippet = (
+        text[start:position] + MARK_START + text[position:end] + MARK_STOP
+        + text[end:start + SNIPPET_CHARS]
+    )
+    return ('…' if start else '') + _highlighted_html(snippet)
+
+
+def search_transcripts(user, query):
+    """Return the user's completed transcripts matching query, best first
+
+    On PostgreSQL this uses the GIN-indexed `search_vector` column and
+    annotates each row with `rank` and a sentinel-highlighted `snippet`,
+    taken from the polished text if it matches and from the raw text
+    otherwise (see result_snippet for the HTML that is returned). Other
+    backends fall back to a substring scan, which is fine for development.
+    """
+    transcriptions = Transcription.objects.filter(user=user, status='completed')
+
+    if uses_postgres_search():
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        return (
+            transcriptions
+            .filter(search_vector=search_query)
+            .annotate(
+                rank=SearchRank(F('search_vector'), search_query),
+                polished_vector=SearchVector('polished_transcript', config=SEARCH_CONFIG),
+            )
+            .annotate(
+                snippet=Case(
+                    When(polished_vector=search_query, then=_headline('polished_transcript', search_query)),
+                    default=_headline('raw_transcript', search_query),
+                ),
+            )
+            .only('id', 'created_at', 'completed_at')
+            .order_by('-rank', '-created_at')
+        )
+
+    return (
+        transcriptions
+        .filter(Q(polished_transcript__icontains=query) | Q(raw_transcript__icontains=query))
+        .annotate(rank=Value(1.0))
+        .order_by('-created_at')
+    )
+
+
+def result_snippet(transcription, query):
+    """HTML snippet for a search hit: escaped text, matches wrapped in <mark>"""
+    snippet = getattr(transcription, 'snippet', None)
+    if snippet is not None:
+        return _highlighted_html(snippet)
+    # Snippet from whichever version matched, preferring the polished one
+    texts = (transcription.polished_transcript, transcription.raw_transcript)
+    text = next(
+        (candidate for candidate in texts if query.lower() in candidate.lower()),
+        texts[0] or texts[1],
+    )
+    return _plain_snippet(text, query)
@@ -0,0 +1,125 @@
+import sys
+from array import array
+
+
+def _pack(values):
+    """Serialize an array of uint32 values as little-endian bytes"""
+    if sys.byteorder != 'little':
+        values = array('I', values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(data):
+    """Load little-endian uint32 bytes back into an array"""
+    values = array('I')
+    values.frombytes(bytes(data))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _format_timestamp(ms, separator):
+    """Format milliseconds as HH:MM:SS<separator>mmm"""
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{ms:03d}"
+
+
+class SegmentColumns:
+    """Columnar storage for timestamped transcript segments
+
+    Start/end times are kept as millisecond uint32 arrays and the segment
+    texts are concatenated into one string, with `offsets[i]:offsets[i + 1]`
+    marking where segment i lives. This keeps multi-hour transcripts to a
+    few compact blobs instead of thousands of rows or objects.
+    """
+
+    def __init__(self, starts=None, ends=None, offsets=None, text=''):
+        self.starts = starts if starts is not None else array('I')
+        self.ends = ends if ends is not None else array('I')
+        self.offsets = offsets if offsets is not None else array('I', [0])
+        self._parts = [text] if text else []
+        self._length = self.offsets[-1]
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def text(self):
+        if len(self._parts) > 1:
+            self._parts = [''.join(self._parts)]
+        return self._parts[0] if self._parts else ''
+
+    def extend(self, segments, offset_seconds=0.0):
+        """Append Whisper segments, shifting them by the chunk's start time"""
+        for segment in segments:
+            text = segment.text.strip()
+            if not text:
+                continue
+            self.starts.append(max(0, round((segment.start + offset_seconds) * 1000)))
+            self.ends.append(max(0, round((segment.end + offset_seconds) * 1000)))
+            self._parts.append(text)
+            self._length += len(text)
+            self.offsets.append(self._length)
+
+    def to_fields(self):
+        """Return the columns as model field values"""
+        return {
+            'starts': _pack(self.starts),
+            'ends': _pack(self.ends),
+            'offsets': _pack(self.offsets),
+            'text': self.text,
+        }
+
+    @classmethod
+    def from_fields(cls, starts, ends, offsets, text):
+        """Rebuild the columns from stored model field values"""
+        return cls(_unpack(starts), _unpack(ends), _unpack(offsets), text)
+
+    def cues(self):
+        """Yield (start_ms, end_ms, text) for every segment"""
+        text = self.text
+        offsets = self.offsets
+        for i in range(len(self.starts)):
+            yield self.starts[i], self.ends[i], text[offsets[i]:offsets[i + 1]]
+
+
+def _buffered(lines, block_size=64 * 1024):
+    """Group small strings into larger blocks for streaming responses"""
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def iter_srt(columns):
+    """Stream the segments as a SubRip (.srt) document"""
+    def lines():
+        for index, (start, end, text) in enumerate(columns.cues(), start=1):
+            yield (
+                f"{index}\n"
+                f"{_format_timestamp(start, ',')} --> {_format_timestamp(end, ',')}\n"
+                f"{text}\n\n"
+            )
+    return _buffered(lines())
+
+
+def iter_vtt(columns):
+    """Stream the segments as a WebVTT (.vtt) document"""
+    def lines():
+        yield "WEBVTT\n\n"
+        for start, end, text in columns.cues():
+            yield (
+                f"{_format_timestamp(start, '.')} --> {_format_timestamp(end, '.')}\n"
+                f"{text}\n\n"
+            )
+    return _buffered(lines())
@@ -1,3 +1,1023 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from array import array
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import async_service, transcription_service
+from .api import MAX_STATUS_IDS, ArchiveTooLarge, _spool_member
+from .forms import TranscriptionForm
+from .management.commands.startup_benchmark import HEAVY_MODULES
+from .media_probe import check_probe, read_header, sniff_container
+from .models import (
+    ApiToken,
+    PolishCacheEntry,
+    Transcription,
+    TranscriptSegments,
+    UsageDaily,
+    UsageRecord,
+    UserProfile,
+    WebhookEndpoint,
+    WebhookEvent,
+)
+from .polish_cache import evict_polish_cache, get_cached_polish, store_polish
+from .segments import SegmentColumns, _pack, _unpack, iter_srt, iter_vtt
+from .usage import UsageMeter, _bump_daily, record_usage, usage_dashboard
+from .webhooks import (
+    MAX_EVENTS_PER_DELIVERY,
+    RETRY_BASE_SECONDS,
+    SIGNATURE_HEADER,
+    TIMESTAMP_HEADER,
+    check_webhook_url,
+    dispatch_due_events,
+    sign_payload,
+)
+
+
+class SweepMediaTests(TestCase):
+    """Keep/delete rules of `manage.py sweep_media`"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.media_root, 'videos'))
+
+    def make_file(self, name, age_minutes=120, size=1000):
+        path = os.path.join(self.media_root, 'videos', name)
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        mtime = time.time() - age_minutes * 60
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def make_job(self, name, status, age_days=0):
+        transcription = Transcription.objects.create(video_file=f'videos/{name}', status=status)
+        if age_days:
+            Transcription.objects.filter(pk=transcription.pk).update(
+                created_at=timezone.now() - timedelta(days=age_days)
+            )
+        return transcription
+
+    def sweep(self, *args):
+        output = StringIO()
+        call_command('sweep_media', *args, stdout=output)
+        return output.getvalue()
+
+    def test_removes_orphaned_upload(self):
+        path = self.make_file('orphan.mp3')
+        self.sweep()
+        self.assertFalse(os.path.exists(path))
+
+    def test_keeps_files_inside_grace_window(self):
+        path = self.make_file('just_uploaded.mp3', age_minutes=5)
+        self.sweep()
+        self.assertTrue(os.path.exists(path))
+
+    def test_keeps_chunks_of_active_jobs(self):
+        self.make_job('active.mp3', 'processing')
+        upload = self.make_file('active.mp3')
+        chunk = self.make_file('active_chunk_0.mp3')
+        self.sweep()
+        self.assertTrue(os.path.exists(upload))
+        self.assertTrue(os.path.exists(chunk))
+
+    def test_removes_chunks_of_finished_jobs(self):
+        self.make_job('done.mp3', 'completed')
+        self.make_job('broken.mp3', 'failed')
+        done_chunk = self.make_file('done_chunk_1.mp3')
+        broken_chunk = self.make_file('broken_chunk_0.mp3')
+        broken_upload = self.make_file('broken.mp3')
+        self.sweep()
+        self.assertFalse(os.path.exists(done_chunk))
+        self.assertFalse(os.path.exists(broken_chunk))
+        # The failed job's own upload is still within retention
+        self.assertTrue(os.path.exists(broken_upload))
+
+    def test_upload_named_like_a_chunk_is_treated_as_upload(self):
+        self.make_job('meeting_chunk_1.mp3', 'pending')
+        path = self.make_file('meeting_chunk_1.mp3')
+        self.sweep()
+        self.assertTrue(os.path.exists(path))
+
+    def test_removes_leftover_upload_of_completed_job(self):
+        self.make_job('finished.mp3', 'completed')
+        path = self.make_file('finished.mp3')
+        self.sweep()
+        self.assertFalse(os.path.exists(path))
+
+    def test_failed_upload_retention(self):
+        old = self.make_job('old_failure.mp3', 'failed', age_days=10)
+        recent = self.make_job('new_failure.mp3', 'failed', age_days=2)
+        old_path = self.make_file('old_failure.mp3')
+        recent_path = self.make_file('new_failure.mp3')
+
+        self.sweep('--failed-days', '7')
+
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(recent_path))
+        old.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual(old.video_file.name, '')
+        self.assertEqual(recent.video_file.name, 'videos/new_failure.mp3')
+
+    def test_expires_stale_jobs(self):
+        stale = self.make_job('stuck.mp3', 'processing', age_days=3)
+        fresh = self.make_job('running.mp3', 'processing')
+        self.sweep('--stale-hours', '24')
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, 'failed')
+        self.assertEqual(fresh.status, 'processing')
+
+    def test_expired_jobs_notify_webhooks(self):
+        user = User.objects.create_user('owner')
+        endpoint = WebhookEndpoint.objects.create(user=user, url='https://example.com/hook')
+        stale = self.make_job('stuck.mp3', 'pending', age_days=3)
+        Transcription.objects.filter(pk=stale.pk).update(user=user)
+
+        self.sweep('--stale-hours', '24')
+
+        event = WebhookEvent.objects.get(endpoint=endpoint)
+        self.assertEqual(event.event, 'transcription.failed')
+        self.assertEqual(event.payload['id'], stale.pk)
+
+    def test_expires_unused_polish_cache_entries(self):
+        store_polish('old', 'Old text.')
+        store_polish('recent', 'Recent text.')
+        PolishCacheEntry.objects.filter(key='old').update(last_used=timezone.now() - timedelta(days=40))
+
+        output = self.sweep('--polish-cache-days', '30')
+
+        self.assertEqual(list(PolishCacheEntry.objects.values_list('key', flat=True)), ['recent'])
+        self.assertIn('dropped 1 polish cache entries', output)
+
+    def test_dry_run_deletes_nothing(self):
+        self.make_job('done.mp3', 'completed')
+        orphan = self.make_file('orphan.mp3', size=2048)
+        chunk = self.make_file('done_chunk_0.mp3', size=2048)
+        stale = self.make_job('stuck.mp3', 'pending', age_days=3)
+
+        output = self.sweep('--dry-run')
+
+        self.assertTrue(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(chunk))
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, 'pending')
+        self.assertIn('Removed 2 files', output)
+        self.assertIn('[dry run]', output)
+
+
+MP3_HEADER = b'ID3\x04\x00\x00\x00\x00\x00\x00' + b'\x00' * 100
+WAV_HEADER = b'RIFF\x24\x08\x00\x00WAVEfmt ' + b'\x00' * 100
+MP4_HEADER = b'\x00\x00\x00\x20ftypisom\x00\x00\x02\x00' + b'\x00' * 100
+MKV_HEADER = b'\x1a\x45\xdf\xa3\x9f\x42\x86\x81\x01' + b'\x00' * 100
+GOOD_PROBE = {'duration': 1800.0, 'has_audio': True, 'audio_codec': 'mp3', 'bitrate': 128000}
+
+
+class MediaProbeTests(SimpleTestCase):
+    """Magic-byte sniffing and probe checks done at upload time"""
+
+    def test_sniff_container(self):
+        cases = [
+            (MP3_HEADER, 'mp3'),
+            (b'\xff\xfb\x90\x64' + b'\x00' * 100, 'mp3'),  # Bare MPEG audio frame
+            (b'\x00' * 16 + MP3_HEADER, 'mp3'),
+            (WAV_HEADER, 'wav'),
+            (MP4_HEADER, 'mp4'),
+            (MKV_HEADER, 'matroska'),
+            (b'RIFF\x24\x08\x00\x00AVI LIST' + b'\x00' * 100, None),
+            (b'%PDF-1.7\n' + b'garbage' * 20, None),
+            (b'', None),
+        ]
+        for header, expected in cases:
+            with self.subTest(header=header[:12]):
+                self.assertEqual(sniff_container(header), expected)
+
+    def test_read_header_keeps_position(self):
+        upload = SimpleUploadedFile('talk.mp3', MP3_HEADER)
+        upload.seek(5)
+        self.assertEqual(read_header(upload, size=3), b'ID3')
+        self.assertEqual(upload.tell(), 5)
+
+    def test_check_probe(self):
+        check_probe(None)  # ffprobe not installed
+        check_probe(GOOD_PROBE)
+        with self.assertRaisesMessage(ValidationError, 'no audio track'):
+            check_probe({**GOOD_PROBE, 'has_audio': False})
+        with override_settings(MAX_MEDIA_DURATION_SECONDS=600):
+            with self.assertRaisesMessage(ValidationError, 'The maximum is 0.2 hours'):
+                check_probe(GOOD_PROBE)
+
+
+class TranscriptionFormTests(SimpleTestCase):
+    """clean_video_file: extension, magic bytes and probe results"""
+
+    def make_form(self, name, content, probe=GOOD_PROBE):
+        with mock.patch('transcribe_script.forms.probe_media', return_value=probe):
+            form = TranscriptionForm(files={'video_file': SimpleUploadedFile(name, content)})
+            form.is_valid()
+        return form
+
+    def test_accepts_media_and_stores_probe(self):
+        form = self.make_form('talk.mp3', MP3_HEADER)
+        self.assertTrue(form.is_valid(), form.errors)
+
+        transcription = form.save(commit=False)
+
+        self.assertEqual(transcription.container, 'mp3')
+        self.assertEqual(transcription.duration_seconds, 1800.0)
+        self.assertEqual(transcription.audio_codec, 'mp3')
+
+    def test_accepts_any_known_container_without_ffprobe(self):
+        for name, content in (('a.wav', WAV_HEADER), ('a.m4a', MP4_HEADER), ('a.mkv', MKV_HEADER)):
+            with self.subTest(name=name):
+                self.assertTrue(self.make_form(name, content, probe=None).is_valid())
+
+    def test_rejects_renamed_file(self):
+        form = self.make_form('notes.mp3', b'%PDF-1.7\n' + b'garbage' * 20)
+        self.assertIn('does not look like audio or video', form.errors['video_file'][0])
+
+    def test_rejects_unsupported_extension(self):
+        form = self.make_form('notes.txt', MP3_HEADER)
+        self.assertIn('Unsupported file format', form.errors['video_file'][0])
+
+    def test_rejects_silent_video(self):
+        form = self.make_form('clip.mp4', MP4_HEADER, probe={**GOOD_PROBE, 'has_audio': False})
+        self.assertIn('no audio track', form.errors['video_file'][0])
+
+
+def chat_response(content, model='gpt-4-0613', prompt_tokens=100, completion_tokens=80):
+    return SimpleNamespace(
+        model=model,
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+    )
+
+
+class FakeOpenAI:
+    """Stands in for openai.OpenAI; "polishes" a window by upper-casing it"""
+
+    calls = []
+
+    def __init__(self, api_key):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model, messages):
+        self.calls.append(messages[-1]['content'])
+        return chat_response(messages[-1]['content'].upper())
+
+
+class PolishCacheTests(TestCase):
+    """Deterministic windows, cache hits and LRU eviction of the polish cache"""
+
+    def setUp(self):
+        FakeOpenAI.calls = []
+        patcher = mock.patch('openai.OpenAI', FakeOpenAI)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        sentence = "This is a sentence of a long interview. "
+        self.transcript = "\n\n".join(f"Part {i}. " + sentence * 40 for i in range(6))
+
+    def test_windows_are_deterministic(self):
+        windows = transcription_service.split_into_windows(self.transcript, max_chars=2000)
+
+        self.assertGreater(len(windows), 1)
+        self.assertTrue(all(len(window) <= 2000 for window in windows))
+        self.assertEqual(windows, transcription_service.split_into_windows(self.transcript, max_chars=2000))
+        self.assertEqual(' '.join(' '.join(windows).split()), ' '.join(self.transcript.split()))
+
+    def test_rerun_makes_no_api_calls(self):
+        first = transcription_service.polish_with_chatgpt(self.transcript, 'sk-test')
+        calls = len(FakeOpenAI.calls)
+        self.assertEqual(calls, len(transcription_service.split_into_windows(self.transcript)))
+
+        second = transcription_service.polish_with_chatgpt(self.transcript, 'sk-test')
+
+        self.assertEqual(second, first)
+        self.assertEqual(len(FakeOpenAI.calls), calls)
+
+    def test_prompt_version_change_misses_cache(self):
+        transcription_service.polish_with_chatgpt(self.transcript, 'sk-test')
+        calls = len(FakeOpenAI.calls)
+
+        with mock.patch.object(transcription_service, 'POLISH_PROMPT_VERSION', 2):
+            transcription_service.polish_with_chatgpt(self.transcript, 'sk-test')
+
+        self.assertEqual(len(FakeOpenAI.calls), 2 * calls)
+
+    def test_eviction_keeps_recently_hit_keys(self):
+        start = timezone.now() - timedelta(hours=1)
+        for minutes, key in enumerate(['a', 'b', 'c']):
+            store_polish(key, key.upper())
+            PolishCacheEntry.objects.filter(key=key).update(last_used=start + timedelta(minutes=minutes))
+
+        self.assertEqual(get_cached_polish(['a', 'missing']), {'a': 'A'})
+        evict_polish_cache(max_entries=2)
+
+        self.assertEqual(set(PolishCacheEntry.objects.values_list('key', flat=True)), {'a', 'c'})
+
+
+class FakeAsyncOpenAI:
+    """Stands in for openai.AsyncOpenAI
+
+    Whisper returns transcript_text for every chunk; polishing upper-cases
+    a window after a short delay, or raises if it contains fail_on.
+    """
+
+    transcript_text = "Hello world."
+    fail_on = None
+
+    def __init__(self, api_key):
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self.transcribe))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.polish))
+
+    async def transcribe(self, model, file, response_format, timestamp_granularities):
+        return SimpleNamespace(
+            text=self.transcript_text,
+            duration=2.0,
+            usage=None,
+            segments=[whisper_segment(0.0, 2.0, self.transcript_text[:50])],
+        )
+
+    async def polish(self, model, messages):
+        content = messages[-1]['content']
+        if self.fail_on and self.fail_on in content:
+            raise RuntimeError("polish failed")
+        await asyncio.sleep(0.05)
+        return chat_response(content.upper())
+
+
+class AsyncWorkerTests(TransactionTestCase):
+    """Job claiming and the asyncio pipeline with a stubbed OpenAI client
+
+    The ORM calls run in sync_to_async threads, so rows have to be committed.
+    """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(self.media_root, 'videos'))
+
+        for patcher in (
+            mock.patch('openai.AsyncOpenAI', FakeAsyncOpenAI),
+            # Split in the default thread pool instead of worker processes
+            mock.patch.object(async_service, 'get_cpu_pool', return_value=None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        FakeAsyncOpenAI.transcript_text = "Hello world."
+        FakeAsyncOpenAI.fail_on = None
+        self.user = User.objects.create_user('worker-owner')
+
+    def make_job(self, name='talk.mp3', status='processing'):
+        with open(os.path.join(self.media_root, 'videos', name), 'wb') as f:
+            f.write(MP3_HEADER)
+        return Transcription.objects.create(
+            user=self.user, video_file=f'videos/{name}', status=status, api_key='sk-test1234'
+        )
+
+    def run_job(self, transcription):
+        async def run():
+            return await async_service.aprocess_transcription(
+                transcription, asyncio.Semaphore(2), asyncio.Semaphore(2)
+            )
+        return asyncio.run(run())
+
+    def test_claim_pending_jobs(self):
+        first = self.make_job('first.mp3', status='pending')
+        second = self.make_job('second.mp3', status='pending')
+        self.make_job('running.mp3', status='processing')
+
+        self.assertEqual([job.pk for job in asyncio.run(async_service.claim_pending_jobs(1))], [first.pk])
+        self.assertEqual([job.pk for job in asyncio.run(async_service.claim_pending_jobs(5))], [second.pk])
+        self.assertEqual(asyncio.run(async_service.claim_pending_jobs(5)), [])
+        self.assertFalse(Transcription.objects.filter(status='pending').exists())
+
+    def test_pipeline_completes(self):
+        transcription = self.make_job()
+
+        self.assertTrue(self.run_job(transcription))
+
+        transcription.refresh_from_db()
+        self.assertEqual(transcription.status, 'completed')
+        self.assertEqual(transcription.raw_transcript, 'Hello world.')
+        self.assertEqual(transcription.polished_transcript, 'HELLO WORLD.')
+        self.assertEqual(transcription.api_key, '')
+        self.assertEqual(transcription.segments.text, 'Hello world.')
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'videos', 'talk.mp3')))
+        self.assertEqual(
+            set(UsageRecord.objects.values_list('kind', 'key_hint')),
+            {('transcription', '1234'), ('chat', '1234')}
+        )
+
+    def test_failed_polish_still_meters_finished_windows(self):
+        FakeAsyncOpenAI.transcript_text = "\n\n".join(
+            f"Part {i}. " + "Some words of the interview. " * 180 for i in range(3)
+        )
+        FakeAsyncOpenAI.fail_on = "Part 0."
+        transcription = self.make_job()
+
+        self.assertFalse(self.run_job(transcription))
+
+        transcription.refresh_from_db()
+        self.assertEqual(transcription.status, 'failed')
+        self.assertEqual(transcription.error_message, 'polish failed')
+        chat = UsageRecord.objects.get(kind='chat')
+        self.assertEqual(chat.prompt_tokens, 200)  # Both windows that finished
+        self.assertEqual(PolishCacheEntry.objects.count(), 2)
+
+    def test_worker_requires_worker_mode(self):
+        with override_settings(TRANSCRIPTION_BACKGROUND='thread'):
+            with self.assertRaisesMessage(CommandError, "TRANSCRIPTION_BACKGROUND must be 'worker'"):
+                call_command('run_transcription_worker', '--once')
+
+
+def whisper_segment(start, end, text):
+    return SimpleNamespace(start=start, end=end, text=text)
+
+
+class SegmentColumnsTests(SimpleTestCase):
+    """Columnar segment storage and the subtitle formats built from it"""
+
+    def make_columns(self):
+        columns = SegmentColumns()
+        columns.extend([whisper_segment(0.0, 1.5, ' Hello '), whisper_segment(1.5, 3.25, 'world.')])
+        # Second chunk: its times start at zero and are shifted by the first chunk's length
+        columns.extend([whisper_segment(0.0, 2.0, 'Again'), whisper_segment(2.0, 2.5, '  ')], offset_seconds=3600.0)
+        return columns
+
+    def test_pack_round_trip(self):
+        values = array('I', [0, 1, 65535, 2 ** 32 - 1])
+        packed = _pack(values)
+        self.assertEqual(len(packed), 16)
+        self.assertEqual(packed[:4], b'\x00\x00\x00\x00')
+        self.assertEqual(packed[4:8], b'\x01\x00\x00\x00')  # Little-endian
+        self.assertEqual(_unpack(packed), values)
+        self.assertEqual(_unpack(memoryview(packed)), values)
+
+    def test_chunk_offsets_and_blank_segments(self):
+        columns = self.make_columns()
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(list(columns.cues()), [
+            (0, 1500, 'Hello'),
+            (1500, 3250, 'world.'),
+            (3600000, 3602000, 'Again'),
+        ])
+
+    def test_fields_round_trip(self):
+        columns = self.make_columns()
+        restored = SegmentColumns.from_fields(**columns.to_fields())
+        self.assertEqual(list(restored.cues()), list(columns.cues()))
+
+    def test_srt(self):
+        self.assertEqual(''.join(iter_srt(self.make_columns())), (
+            "1\n00:00:00,000 --> 00:00:01,500\nHello\n\n"
+            "2\n00:00:01,500 --> 00:00:03,250\nworld.\n\n"
+            "3\n01:00:00,000 --> 01:00:02,000\nAgain\n\n"
+        ))
+
+    def test_vtt(self):
+        self.assertEqual(''.join(iter_vtt(self.make_columns())), (
+            "WEBVTT\n\n"
+            "00:00:00.000 --> 00:00:01.500\nHello\n\n"
+            "00:00:01.500 --> 00:00:03.250\nworld.\n\n"
+            "01:00:00.000 --> 01:00:02.000\nAgain\n\n"
+        ))
+
+    def test_empty_columns(self):
+        columns = SegmentColumns.from_fields(**SegmentColumns().to_fields())
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(''.join(iter_vtt(columns)), "WEBVTT\n\n")
+
+
+class SubtitleDownloadTests(TestCase):
+    """Subtitle links on the status page and the download view"""
+
+    def setUp(self):
+        self.transcription = Transcription.objects.create(
+            video_file='videos/talk.mp3', status='completed', raw_transcript='Hello world.'
+        )
+
+    def add_segments(self, columns):
+        TranscriptSegments.objects.create(transcription=self.transcription, **columns.to_fields())
+
+    def test_links_shown_only_with_cues(self):
+        url = reverse('transcription_status', args=[self.transcription.pk])
+        self.assertNotContains(self.client.get(url), 'Subtitles (SRT)')
+
+        self.add_segments(SegmentColumns())
+        self.assertNotContains(self.client.get(url), 'Subtitles (SRT)')
+
+        TranscriptSegments.objects.all().delete()
+        columns = SegmentColumns()
+        columns.extend([whisper_segment(0.0, 1.0, 'Hello world.')])
+        self.add_segments(columns)
+        self.assertContains(self.client.get(url), 'Subtitles (SRT)')
+
+    def test_download_srt(self):
+        columns = SegmentColumns()
+        columns.extend([whisper_segment(0.0, 1.0, 'Hello world.')])
+        self.add_segments(columns)
+
+        response = self.client.get(reverse('download_transcript', args=[self.transcription.pk, 'srt']))
+
+        self.assertEqual(response['Content-Type'], 'application/x-subrip; charset=utf-8')
+        self.assertEqual(
+            b''.join(response.streaming_content),
+            b"1\n00:00:00,000 --> 00:00:01,000\nHello world.\n\n"
+        )
+
+    def test_download_without_cues_is_404(self):
+        self.add_segments(SegmentColumns())
+        response = self.client.get(reverse('download_transcript', args=[self.transcription.pk, 'vtt']))
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchViewTests(TestCase):
+    """The search endpoint on the SQLite fallback path"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('searcher')
+        self.client.force_login(self.user)
+
+    def make_transcription(self, polished, raw='', user=None, status='completed'):
+        return Transcription.objects.create(
+            user=user or self.user,
+            video_file='videos/talk.mp3',
+            status=status,
+            polished_transcript=polished,
+            raw_transcript=raw,
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('search_transcripts'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        self.make_transcription('Say <b>hello</b> & <script>alert(1)</script> world')
+
+        snippet = self.search('world')['results'][0]['snippet']
+
+        self.assertEqual(
+            snippet,
+            'Say &lt;b&gt;hello&lt;/b&gt; &amp; &lt;script&gt;alert(1)&lt;/script&gt; <mark>world</mark>'
+        )
+
+    def test_snippet_from_raw_when_only_raw_matches(self):
+        self.make_transcription('Nothing to see here.', raw='um the secret plan, uh')
+
+        snippet = self.search('secret')['results'][0]['snippet']
+
+        self.assertIn('<mark>secret</mark>', snippet)
+        self.assertNotIn('Nothing', snippet)
+
+    def test_only_own_completed_transcripts(self):
+        other = User.objects.create_user('other')
+        self.make_transcription('match in a foreign transcript', user=other)
+        self.make_transcription('match still processing', status='processing')
+        mine = self.make_transcription('my match')
+
+        results = self.search('match')['results']
+
+        self.assertEqual([result['id'] for result in results], [mine.pk])
+
+    def test_missing_query(self):
+        response = self.client.get(reverse('search_transcripts'), {'q': ' '})
+        self.assertEqual(response.status_code, 400)
+
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+@override_settings(TRANSCRIPTION_BACKGROUND='worker')
+class ApiTests(TestCase):
+    """Bearer auth, batch creation and status of the JSON API"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Keep uploads independent of whether ffprobe is installed
+        patcher = mock.patch('transcribe_script.forms.probe_media', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = User.objects.create_user('api-user')
+        UserProfile.objects.create(user=self.user, api_key='sk-test1234')
+        self.token, key = ApiToken.issue(self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {key}'}
+
+    def create(self, **files):
+        return self.client.post(reverse('api_create_transcriptions'), files, **self.auth)
+
+    def status(self, ids):
+        return self.client.get(reverse('api_transcription_status'), {'ids': ids}, **self.auth)
+
+    def test_rejects_missing_or_bad_tokens(self):
+        url = reverse('api_transcription_status')
+        self.assertEqual(self.client.get(url, {'ids': '1'}).status_code, 401)
+        self.assertEqual(self.client.get(url, {'ids': '1'}, HTTP_AUTHORIZATION='Bearer nope').status_code, 401)
+        self.assertEqual(self.client.get(url, {'ids': '1'}, HTTP_AUTHORIZATION='Basic abc').status_code, 401)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.status('1').status_code, 401)
+
+    def test_valid_token_is_marked_used(self):
+        self.assertEqual(self.status('1').status_code, 200)
+        self.token.refresh_from_db()
+        self.assertIsNotNone(self.token.last_used_at)
+
+    def test_creates_batch_and_reports_rejections(self):
+        response = self.create(files=[
+            SimpleUploadedFile('one.mp3', MP3_HEADER),
+            SimpleUploadedFile('two.wav', WAV_HEADER),
+            SimpleUploadedFile('fake.mp3', b'not media at all' * 10),
+        ])
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual([item['name'] for item in data['created']], ['one.mp3', 'two.wav'])
+        self.assertEqual([item['name'] for item in data['rejected']], ['fake.mp3'])
+
+        transcriptions = Transcription.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([t.status for t in transcriptions], ['pending', 'pending'])
+        self.assertEqual([t.container for t in transcriptions], ['mp3', 'wav'])
+        headers = {'mp3': MP3_HEADER, 'wav': WAV_HEADER}
+        for transcription in transcriptions:
+            self.assertEqual(transcription.api_key, 'sk-test1234')
+            # bulk_create still runs FileField.pre_save, which stores the file
+            with transcription.video_file.open('rb') as f:
+                self.assertEqual(f.read(), headers[transcription.container])
+
+    def test_creates_from_archive(self):
+        archive = zip_bytes({'a.mp3': MP3_HEADER, 'dir/b.mp3': MP3_HEADER, '.DS_Store': b'junk'})
+
+        response = self.create(archive=SimpleUploadedFile('batch.zip', archive))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(item['name'] for item in response.json()['created']), ['a.mp3', 'b.mp3'])
+
+    def test_archive_size_limits(self):
+        archive = zip_bytes({'a.mp3': MP3_HEADER, 'b.mp3': MP3_HEADER + b'\x00' * 500})
+
+        with override_settings(API_MAX_ARCHIVE_MEMBER_BYTES=len(MP3_HEADER) + 100):
+            data = self.create(archive=SimpleUploadedFile('batch.zip', archive)).json()
+        self.assertEqual([item['name'] for item in data['created']], ['a.mp3'])
+        self.assertIn('unpacks to more than', data['rejected'][0]['errors'][0])
+
+        with override_settings(API_MAX_ARCHIVE_TOTAL_BYTES=len(MP3_HEADER) + 100):
+            data = self.create(archive=SimpleUploadedFile('batch.zip', archive)).json()
+        self.assertEqual(len(data['created']), 1)
+        self.assertEqual(data['rejected'][0]['name'], 'batch.zip')
+
+    def test_spool_stops_when_declared_size_lies(self):
+        with self.assertRaises(ArchiveTooLarge):
+            _spool_member('liar.mp3', io.BytesIO(b'x' * 5000), 10, 4096)
+
+        upload = _spool_member('honest.mp3', io.BytesIO(b'x' * 4096), 10, 4096)
+        self.addCleanup(upload.close)
+        self.assertEqual(upload.size, 4096)
+        self.assertEqual(len(upload.read()), 4096)
+
+    def test_thread_mode_refuses_batches(self):
+        with override_settings(TRANSCRIPTION_BACKGROUND='thread'):
+            response = self.create(files=[
+                SimpleUploadedFile('one.mp3', MP3_HEADER),
+                SimpleUploadedFile('two.mp3', MP3_HEADER),
+            ])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transcription.objects.exists())
+
+    def test_thread_mode_starts_single_upload(self):
+        started = threading.Event()
+        with override_settings(TRANSCRIPTION_BACKGROUND='thread'), \
+                mock.patch('transcribe_script.api.process_transcription', side_effect=lambda t: started.set()):
+            response = self.create(files=SimpleUploadedFile('one.mp3', MP3_HEADER))
+            self.assertTrue(started.wait(5))
+        self.assertEqual(response.status_code, 201)
+
+    def test_status_is_scoped_to_the_user(self):
+        mine = Transcription.objects.create(user=self.user, video_file='videos/a.mp3', status='completed')
+        other_user = User.objects.create_user('someone-else')
+        theirs = Transcription.objects.create(user=other_user, video_file='videos/b.mp3', status='completed')
+
+        rows = self.status(f'{mine.pk},{theirs.pk}').json()['transcriptions']
+
+        self.assertEqual([row['id'] for row in rows], [mine.pk])
+        self.assertEqual(rows[0]['status'], 'completed')
+
+    def test_status_validates_ids(self):
+        self.assertEqual(self.status('').status_code, 400)
+        self.assertEqual(self.status('1,x').status_code, 400)
+        too_many = ','.join(str(pk) for pk in range(1, MAX_STATUS_IDS + 2))
+        self.assertEqual(self.status(too_many).status_code, 400)
+        self.assertEqual(self.status(','.join(['1'] * MAX_STATUS_IDS)).status_code, 200)
+
+
+class ExportTests(TestCase):
+    """The streamed zip export of a user's transcripts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('exporter')
+        self.client.force_login(self.user)
+        self.transcription = Transcription.objects.create(
+            user=self.user,
+            video_file='videos/talk.mp3',
+            status='completed',
+            raw_transcript='um hello world\n\nsecond part',
+            polished_transcript='Hello, world.\n\nSecond part. ' + 'Long text. ' * 50000,
+        )
+        Transcription.objects.create(user=self.user, video_file='videos/b.mp3', status='processing')
+        other = User.objects.create_user('someone-else')
+        Transcription.objects.create(
+            user=other, video_file='videos/c.mp3', status='completed', raw_transcript='private'
+        )
+
+    def export(self, formats):
+        response = self.client.get(reverse('export_transcripts'), {'formats': formats})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+
+    def test_streamed_zip_is_valid(self):
+        archive = self.export('txt')
+        pk = self.transcription.pk
+
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), [f'transcript_raw_{pk}.txt', f'transcript_polished_{pk}.txt'])
+        self.assertEqual(
+            archive.read(f'transcript_polished_{pk}.txt').decode('utf-8'),
+            self.transcription.polished_transcript
+        )
+
+    def test_xlsx_entries(self):
+        from openpyxl import load_workbook
+
+        archive = self.export('txt,xlsx')
+        pk = self.transcription.pk
+
+        self.assertIsNone(archive.testzip())
+        workbook = load_workbook(io.BytesIO(archive.read(f'transcript_{pk}.xlsx')), read_only=True)
+        self.assertEqual(workbook.sheetnames, ['Polished', 'Raw'])
+        self.assertEqual(
+            [row[0] for row in workbook['Raw'].iter_rows(values_only=True)],
+            ['um hello world', 'second part']
+        )
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('export_transcripts'), {'formats': 'pdf'})
+        self.assertEqual(response.status_code, 400)
+
+
+class UsageTests(TestCase):
+    """Usage ledger, daily rollups and the dashboard built from them"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('billed')
+        self.transcription = Transcription.objects.create(
+            user=self.user, video_file='videos/talk.mp3', status='completed'
+        )
+
+    def make_meter(self, audio_seconds=90.0, prompt_tokens=1000, completion_tokens=500):
+        meter = UsageMeter()
+        meter.add_transcription('whisper-1', SimpleNamespace(usage=None, duration=audio_seconds))
+        meter.add_chat(chat_response('', prompt_tokens=prompt_tokens, completion_tokens=completion_tokens))
+        return meter
+
+    def test_records_ledger_rows_and_rollup(self):
+        record_usage(self.transcription, self.make_meter(), 'sk-abcd1234')
+
+        records = {record.kind: record for record in UsageRecord.objects.all()}
+        self.assertEqual(records['transcription'].cost_usd, Decimal('0.009'))  # 1.5 min at $0.006
+        self.assertEqual(records['chat'].model, 'gpt-4-0613')
+        self.assertEqual(records['chat'].cost_usd, Decimal('0.06'))  # 1k prompt + 0.5k completion
+        self.assertEqual({record.key_hint for record in records.values()}, {'1234'})
+
+        daily = UsageDaily.objects.get()
+        self.assertEqual((daily.jobs, daily.audio_seconds, daily.prompt_tokens), (1, 90.0, 1000))
+        self.assertEqual(daily.cost_usd, Decimal('0.069'))
+
+    def test_rollup_per_key(self):
+        record_usage(self.transcription, self.make_meter(), 'sk-abcd1234')
+        record_usage(self.transcription, self.make_meter(), 'sk-abcd1234')
+        record_usage(self.transcription, self.make_meter(), 'sk-other999')
+
+        rollups = dict(UsageDaily.objects.values_list('key_hint', 'jobs'))
+        self.assertEqual(rollups, {'1234': 2, 'r999': 1})
+        self.assertEqual(UsageRecord.objects.count(), 6)
+
+    def test_nothing_recorded_without_usage_or_user(self):
+        record_usage(self.transcription, UsageMeter(), 'sk-abcd1234')
+        anonymous = Transcription.objects.create(video_file='videos/anon.mp3', status='completed')
+        record_usage(anonymous, self.make_meter(), 'sk-abcd1234')
+
+        self.assertFalse(UsageRecord.objects.exists())
+        self.assertFalse(UsageDaily.objects.exists())
+
+    def test_bump_daily_when_another_job_creates_the_row(self):
+        day = timezone.localdate()
+        UsageDaily.objects.create(user=self.user, day=day, key_hint='1234', jobs=1, prompt_tokens=10)
+
+        # The first update misses the row, as if it was created just after it
+        real_filter = UsageDaily.objects.filter
+        updates = []
+
+        def racing_filter(*args, **kwargs):
+            rows = real_filter(*args, **kwargs)
+            real_update = rows.update
+
+            def update(**kwargs):
+                updates.append(kwargs)
+                return 0 if len(updates) == 1 else real_update(**kwargs)
+            rows.update = update
+            return rows
+
+        with mock.patch.object(UsageDaily.objects, 'filter', side_effect=racing_filter):
+            _bump_daily(self.user.id, day, '1234', jobs=1, prompt_tokens=5)
+
+        self.assertEqual(len(updates), 2)
+        daily = UsageDaily.objects.get()
+        self.assertEqual((daily.jobs, daily.prompt_tokens), (2, 15))
+
+    def test_unique_rollup_per_day_and_key(self):
+        day = timezone.localdate()
+        UsageDaily.objects.create(user=self.user, day=day, key_hint='1234')
+        with self.assertRaises(IntegrityError):
+            UsageDaily.objects.create(user=self.user, day=day, key_hint='1234')
+
+    def test_dashboard(self):
+        today = timezone.localdate()
+        UsageDaily.objects.create(user=self.user, day=today - timedelta(days=40), key_hint='old1', jobs=3, cost_usd=1)
+        record_usage(self.transcription, self.make_meter(), 'sk-abcd1234')
+
+        data = usage_dashboard(self.user, days=30)
+
+        self.assertEqual(data['totals']['jobs'], 4)
+        self.assertEqual(data['totals']['cost_usd'], Decimal('1.069'))
+        self.assertEqual([row['key_hint'] for row in data['by_key']], ['old1', '1234'])
+        self.assertEqual([row['day'] for row in data['recent_days']], [today])
+
+        # Not cached: new usage shows up right away
+        record_usage(self.transcription, self.make_meter(), 'sk-abcd1234')
+        self.assertEqual(usage_dashboard(self.user)['totals']['jobs'], 5)
+
+    def test_dashboard_page(self):
+        record_usage(self.transcription, self.make_meter(), 'sk-abcd1234')
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('usage_dashboard'))
+
+        self.assertContains(response, '1234')
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    """Records webhook POSTs and answers with the server's next status code"""
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.status)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(WEBHOOK_ALLOW_PRIVATE_HOSTS=True)
+class WebhookDispatchTests(TestCase):
+    """Batching, signing and retries of dispatch_due_events"""
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), _Receiver)
+        self.server.received = []
+        self.server.status = 200
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+        user = User.objects.create_user('hooked')
+        self.endpoint = WebhookEndpoint.objects.create(
+            user=user, url=f'http://127.0.0.1:{self.server.server_port}/hook'
+        )
+
+    def make_events(self, count):
+        WebhookEvent.objects.bulk_create([
+            WebhookEvent(endpoint=self.endpoint, event='transcription.completed', payload={'id': i})
+            for i in range(count)
+        ])
+
+    def test_batches_events_per_endpoint(self):
+        self.make_events(MAX_EVENTS_PER_DELIVERY + 20)
+
+        delivered, failed = dispatch_due_events(self.session)
+
+        self.assertEqual((delivered, failed), (MAX_EVENTS_PER_DELIVERY + 20, 0))
+        batch_sizes = [len(json.loads(body)['events']) for _, body in self.server.received]
+        self.assertEqual(batch_sizes, [MAX_EVENTS_PER_DELIVERY, 20])
+        self.assertFalse(WebhookEvent.objects.filter(delivered_at__isnull=True).exists())
+
+    def test_signs_the_body(self):
+        self.make_events(1)
+        dispatch_due_events(self.session)
+
+        headers, body = self.server.received[0]
+        expected = sign_payload(self.endpoint.secret, headers[TIMESTAMP_HEADER], body)
+        self.assertEqual(headers[SIGNATURE_HEADER], f'sha256={expected}')
+
+    def test_failed_delivery_backs_off_then_retries(self):
+        self.make_events(2)
+        self.server.status = 500
+
+        self.assertEqual(dispatch_due_events(self.session), (0, 2))
+        for event in WebhookEvent.objects.all():
+            self.assertEqual(event.attempts, 1)
+            self.assertTrue(event.last_error.startswith('HTTP 500'))
+            delay = (event.next_attempt_at - timezone.now()).total_seconds()
+            self.assertTrue(RETRY_BASE_SECONDS * 0.7 < delay <= RETRY_BASE_SECONDS * 1.2)
+
+        # Not due yet, so nothing is sent
+        self.assertEqual(dispatch_due_events(self.session), (0, 0))
+        self.assertEqual(len(self.server.received), 1)
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.server.status = 200
+        self.assertEqual(dispatch_due_events(self.session), (2, 0))
+        self.assertEqual(set(WebhookEvent.objects.values_list('attempts', flat=True)), {2})
+
+    @override_settings(WEBHOOK_ALLOW_PRIVATE_HOSTS=False)
+    def test_refuses_private_addresses(self):
+        for url in ('http://127.0.0.1/', 'http://10.1.2.3/', 'http://169.254.169.254/', 'http://[::1]/'):
+            with self.assertRaises(ValueError):
+                check_webhook_url(url)
+
+        self.make_events(1)
+        self.assertEqual(dispatch_due_events(self.session), (0, 1))
+        self.assertEqual(self.server.received, [])
+
+
+class StartupTests(SimpleTestCase):
+    """Cold start of a web worker stays free of heavy imports"""
+
+    def test_wsgi_import_skips_heavy_modules(self):
+        # A fresh interpreter, as gunicorn would start it, plus the URLconf
+        # (and so every view module) that the first request loads
+        result = subprocess.run(
+            [sys.executable, '-c', (
+                "import json, sys\n"
+                "from transcribio.wsgi import application\n"
+                "from django.urls import get_resolver\n"
+                "get_resolver().url_patterns\n"
+                "print(json.dumps(sorted(sys.modules)))"
+            )],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        imported = set(json.loads(result.stdout.strip().splitlines()[-1]))
+        self.assertEqual(imported & set(HEAVY_MODULES), set())
+        self.assertIn('transcribe_script.views', imported)
@@ -1,6 +1,13 @@
-from openai import OpenAI
 import os
 from datetime import datetime
+from .models import Transcription, TranscriptSegments
+from .segments import SegmentColumns
+from .search import update_search_index
+from .webhooks import enqueue_transcription_event
+from .usage import UsageMeter, record_usage
+from .polish_cache import polish_cache_key, get_cached_polish, store_polish, evict_polish_cache
+
+WHISPER_MODEL = "whisper-1"
 
 def split_file_into_chunks(file_path, max_size_mb=20):
     """Split file into byte chunks if it exceeds max_size_mb
@@ -38,69 +45,176 @@ def split_file_into_chunks(file_path, max_size_mb=20):
     return chunks
 
 
+def chunk_size_for(file_path):
+    """Chunk size in MB: audio files get 20MB chunks, videos 100MB
+    Chunks are byte slices and only the first one carries the container
+    header, so files are split as little as possible. Sizing chunks by the
+    probed duration needs time-based splitting first.
+    """
+    audio_extensions = ['.mp3', '.wav', '.m4a', '.webm', '.mpeg', '.mpga']
+    is_audio = any(file_path.lower().endswith(ext) for ext in audio_extensions)
+    return 20 if is_audio else 100
+
+
 def transcribe_with_whisper(audio_path, api_key):
-    """Send audio to Whisper API and get raw transcript"""
+    """Send audio to Whisper API and get raw transcript with segment timings
+    Returns the verbose response: `.text`, `.duration` and `.segments`.
+    """
+    from openai import OpenAI  # Heavy import, deferred so web workers boot fast
+
     client = OpenAI(api_key=api_key)
     
     with open(audio_path, 'rb') as audio_file:
         transcript = client.audio.transcriptions.create(
-            model="whisper-1",
-            file=audio_file
+            model=WHISPER_MODEL,
+            file=audio_file,
+            response_format="verbose_json",
+            timestamp_granularities=["segment"]
         )
     
-    return transcript.text
+    return transcript
 
 
-def polish_with_chatgpt(raw_transcript, api_key):
-    """Send raw transcript to ChatGPT for cleanup"""
-    client = OpenAI(api_key=api_key)
-    
+POLISH_MODEL = "gpt-4"
+POLISH_SYSTEM_PROMPT = "You are a professional transcript editor. Clean up the following transcript by fixing grammar, adding proper punctuation, and formatting it nicely. Maintain all the original content and meaning and keep the language the same as the source."
+# Bump whenever POLISH_SYSTEM_PROMPT changes so cached windows are not reused
+POLISH_PROMPT_VERSION = 1
+POLISH_WINDOW_CHARS = 6000
+
+
+def split_into_windows(text, max_chars=POLISH_WINDOW_CHARS):
+    """Split a transcript into polish windows on paragraph/sentence boundaries
+    Splitting is deterministic so re-polishing the same text produces the
+    same windows (and therefore the same cache keys).
+    """
+    pieces = []
+    for paragraph in text.split("\n\n"):
+        paragraph = paragraph.strip()
+        while len(paragraph) > max_chars:
+            cut = paragraph.rfind(". ", 0, max_chars)
+            if cut <= 0:
+                cut = paragraph.rfind(" ", 0, max_chars)
+            cut = cut + 1 if cut > 0 else max_chars
+            pieces.append(paragraph[:cut].strip())
+            paragraph = paragraph[cut:].strip()
+        if paragraph:
+            pieces.append(paragraph)
+
+    windows = []
+    current = []
+    current_size = 0
+    for piece in pieces:
+        if current and current_size + len(piece) > max_chars:
+            windows.append("\n\n".join(current))
+            current = []
+            current_size = 0
+        current.append(piece)
+        current_size += len(piece) + 2
+    if current:
+        windows.append("\n\n".join(current))
+
+    return windows
+
+
+def polish_messages(window_text):
+    """Chat messages asking ChatGPT to clean up one transcript window"""
+    return [
+        {
+            "role": "system",
+            "content": POLISH_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": window_text
+        }
+    ]
+
+
+def polish_window(client, window_text, meter=None):
+    """Send a single transcript window to ChatGPT for cleanup"""
     response = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are a professional transcript editor. Clean up the following transcript by fixing grammar, adding proper punctuation, and formatting it nicely. Maintain all the original content and meaning and keep the language the same as the source."
-            },
-            {
-                "role": "user",
-                "content": raw_transcript
-            }
-        ]
+        model=POLISH_MODEL,
+        messages=polish_messages(window_text)
     )
+    if meter is not None:
+        meter.add_chat(response)
     
     return response.choices[0].message.content
 
 
+def polish_with_chatgpt(raw_transcript, api_key, meter=None):
+    """Send raw transcript to ChatGPT for cleanup, window by window
+    Windows that were already polished (same text, model and prompt
+    version) are served from the polish cache instead of the API.
+    Token usage of the API calls is added to meter when given.
+    """
+    windows = split_into_windows(raw_transcript)
+    keys = [
+        polish_cache_key(window, POLISH_MODEL, POLISH_PROMPT_VERSION)
+        for window in windows
+    ]
+    polished = get_cached_polish(keys)
+
+    client = None
+    for window, key in zip(windows, keys):
+        if key in polished:
+            continue
+        if client is None:
+            from openai import OpenAI
+
+            client = OpenAI(api_key=api_key)
+        polished[key] = polish_window(client, window, meter)
+        # Store right away so a failure later on still keeps this window
+        store_polish(key, polished[key])
+
+    if client is not None:
+        evict_polish_cache()
+
+    return "\n\n".join(polished[key] for key in keys)
+
+
 def process_transcription(transcription_obj):
     """Main function that processes a Transcription object"""
+    file_path = None
+    file_chunks = []
+    meter = UsageMeter()
+    api_key = transcription_obj.api_key  # Cleared on success, needed for the usage ledger
+
+    # Claim the job atomically so a worker can't pick it up and bill it twice
+    claimed = Transcription.objects.filter(
+        pk=transcription_obj.pk, status='pending'
+    ).update(status='processing')
+    if not claimed:
+        return False
+    transcription_obj.status = 'processing'
+
     try:
-        # Update status
-        transcription_obj.status = 'processing'
-        transcription_obj.save()
 
         # Step 1: Get the file path
         file_path = transcription_obj.video_file.path
 
         # Step 2: Determine if it's audio or video and set appropriate chunk size
-        audio_extensions = ['.mp3', '.wav', '.m4a', '.webm', '.mpeg', '.mpga']
-        is_audio = any(file_path.lower().endswith(ext) for ext in audio_extensions)
-
-        # MP3s: 20MB chunks, Videos: 100MB chunks
-        max_chunk_size = 20 if is_audio else 100
+        max_chunk_size = chunk_size_for(file_path)
 
         # Step 3: Split file into chunks if needed
         file_chunks = split_file_into_chunks(file_path, max_size_mb=max_chunk_size)
 
         all_raw_transcripts = []
+        segments = SegmentColumns()
+        chunk_offset = 0.0
 
         # Step 4: Transcribe each chunk with Whisper
         for chunk_path in file_chunks:
-            raw_transcript = transcribe_with_whisper(
+            transcript = transcribe_with_whisper(
                 chunk_path,
                 transcription_obj.api_key
             )
-            all_raw_transcripts.append(raw_transcript)
+            all_raw_transcripts.append(transcript.text)
+            meter.add_transcription(WHISPER_MODEL, transcript)
+
+            # Shift segment timings by the length of the chunks before this one
+            segments.extend(transcript.segments or [], offset_seconds=chunk_offset)
+            chunk_offset += transcript.duration or 0.0
 
             # Clean up chunk if it's not the original file
             if chunk_path != file_path:
@@ -112,10 +226,16 @@ def process_transcription(transcription_obj):
         transcription_obj.raw_transcript = combined_raw_transcript
         transcription_obj.save()
 
+        TranscriptSegments.objects.update_or_create(
+            transcription=transcription_obj,
+            defaults=segments.to_fields()
+        )
+
         # Step 5: Polish with ChatGPT
         polished_transcript = polish_with_chatgpt(
             combined_raw_transcript,
-            transcription_obj.api_key
+            transcription_obj.api_key,
+            meter
         )
         transcription_obj.polished_transcript = polished_transcript
 
@@ -124,6 +244,8 @@ def process_transcription(transcription_obj):
         transcription_obj.completed_at = datetime.now()
         transcription_obj.api_key = ""  # Clear the API key for security
         transcription_obj.save()
+        update_search_index(transcription_obj)
+        enqueue_transcription_event(transcription_obj)
 
         # Step 7: Clean up files to save storage
         # Delete the original uploaded file
@@ -136,4 +258,17 @@ def process_transcription(transcription_obj):
         transcription_obj.status = 'failed'
         transcription_obj.error_message = str(e)
         transcription_obj.save()
-        return False
\ No newline at end of file
+        enqueue_transcription_event(transcription_obj)
+        return False
+
+    finally:
+        # Chunks left behind by a failure mid-loop
+        for chunk_path in file_chunks:
+            if chunk_path != file_path and os.path.exists(chunk_path):
+                os.remove(chunk_path)
+
+        # Failed jobs are billed for the calls they made too
+        try:
+            record_usage(transcription_obj, meter, api_key)
+        except Exception as e:
+            print(f"Could not record usage for transcription {transcription_obj.id}: {e}")
\ No newline at end of file
@@ -1,10 +1,18 @@
 from django.urls import path
 from . import views
+from . import api
 
 urlpatterns = [
     path('', views.upload_video, name='upload_video'),
     path('status/<int:pk>/', views.transcription_status, name='transcription_status'),
     path('download/<int:pk>/<str:transcript_type>/', views.download_transcript, name='download_transcript'),
     path('profile/', views.profile_settings, name='profile_settings'), 
+    path('search/', views.search, name='search_transcripts'),
+    path('export/', views.export_transcripts, name='export_transcripts'),
+    path('usage/', views.usage, name='usage_dashboard'),
+    path('api/transcriptions/', api.api_create_transcriptions, name='api_create_transcriptions'),
+    path('api/transcriptions/status/', api.api_transcription_status, name='api_transcription_status'),
+    path('api/webhooks/', api.api_webhooks, name='api_webhooks'),
+    path('api/webhooks/<int:pk>/', api.api_webhook_delete, name='api_webhook_delete'),
 
 ]
\ No newline at end of file
@@ -0,0 +1,146 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import UsageDaily, UsageRecord
+
+# OpenAI list prices in USD; update when OpenAI changes them.
+# Costs are estimates; the user's OpenAI invoice is authoritative.
+WHISPER_PRICE_PER_MINUTE = {'whisper-1': Decimal('0.006')}
+CHAT_PRICE_PER_1K_TOKENS = {'gpt-4': (Decimal('0.03'), Decimal('0.06'))}  # (prompt, completion)
+
+
+class UsageMeter:
+    """Collects the API usage of one job until it is written to the ledger"""
+
+    def __init__(self):
+        self.transcription_model = ''
+        self.audio_seconds = 0.0
+        self.chat_model = ''
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add_transcription(self, model, transcript):
+        """Count the audio seconds billed for a Whisper response"""
+        self.transcription_model = model
+        usage = getattr(transcript, 'usage', None)
+        seconds = getattr(usage, 'seconds', None) or transcript.duration or 0.0
+        self.audio_seconds += seconds
+
+    def add_chat(self, response):
+        """Count the tokens of a chat completion response"""
+        self.chat_model = response.model or self.chat_model
+        if response.usage is not None:
+            self.prompt_tokens += response.usage.prompt_tokens
+            self.completion_tokens += response.usage.completion_tokens
+
+
+def _price_key(model, prices):
+    """Match dated model names like gpt-4-0613 to their base price"""
+    for name in sorted(prices, key=len, reverse=True):
+        if model.startswith(name):
+            return name
+    return None
+
+
+def transcription_cost(model, audio_seconds):
+    name = _price_key(model, WHISPER_PRICE_PER_MINUTE)
+    if name is None:
+        return Decimal(0)
+    return WHISPER_PRICE_PER_MINUTE[name] * Decimal(audio_seconds) / 60
+
+
+def chat_cost(model, prompt_tokens, completion_tokens):
+    name = _price_key(model, CHAT_PRICE_PER_1K_TOKENS)
+    if name is None:
+        return Decimal(0)
+    prompt_price, completion_price = CHAT_PRICE_PER_1K_TOKENS[name]
+    return (prompt_price * prompt_tokens + completion_price * completion_tokens) / 1000
+
+
+def _bump_daily(user_id, day, key_hint, **amounts):
+    """Add amounts to a rollup row, creating it on first use"""
+    increments = {field: F(field) + value for field, value in amounts.items()}
+    rows = UsageDaily.objects.filter(user_id=user_id, day=day, key_hint=key_hint)
+    if rows.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            UsageDaily.objects.create(user_id=user_id, day=day, key_hint=key_hint, **amounts)
+    except IntegrityError:
+        # Another job created the row in the meantime
+        rows.update(**increments)
+
+
+def record_usage(transcription, meter, api_key):
+    """Append the job's usage to the ledger and fold it into the daily rollup"""
+    if transcription.user_id is None:
+        return
+    key_hint = api_key[-4:] if api_key else ''
+
+    records = []
+    if meter.audio_seconds:
+        records.append(UsageRecord(
+            kind='transcription',
+            model=meter.transcription_model,
+            audio_seconds=meter.audio_seconds,
+            cost_usd=transcription_cost(meter.transcription_model, meter.audio_seconds),
+        ))
+    if meter.prompt_tokens or meter.completion_tokens:
+        records.append(UsageRecord(
+            kind='chat',
+            model=meter.chat_model,
+            prompt_tokens=meter.prompt_tokens,
+            completion_tokens=meter.completion_tokens,
+            cost_usd=chat_cost(meter.chat_model, meter.prompt_tokens, meter.completion_tokens),
+        ))
+    if not records:
+        return
+
+    for record in records:
+        record.user_id = transcription.user_id
+        record.transcription = transcription
+        record.key_hint = key_hint
+
+    with transaction.atomic():
+        UsageRecord.objects.bulk_create(records)
+        _bump_daily(
+            transcription.user_id,
+            timezone.localdate(),
+            key_hint,
+            jobs=1,
+            audio_seconds=meter.audio_seconds,
+            prompt_tokens=meter.prompt_tokens,
+            completion_tokens=meter.completion_tokens,
+            cost_usd=sum((record.cost_usd for record in records), Decimal(0)),
+        )
+
+
+def usage_dashboard(user, days=30):
+    """Totals for the dashboard, read only from the small rollup table"""
+    totals_fields = {
+        'jobs': Sum('jobs'),
+        'audio_seconds': Sum('audio_seconds'),
+        'prompt_tokens': Sum('prompt_tokens'),
+        'completion_tokens': Sum('completion_tokens'),
+        'cost_usd': Sum('cost_usd'),
+    }
+    rollups = UsageDaily.objects.filter(user=user)
+    since = timezone.localdate() - timedelta(days=days - 1)
+
+    return {
+        'totals': rollups.aggregate(**totals_fields),
+        'by_key': list(rollups.values('key_hint').annotate(**totals_fields).order_by('-cost_usd')),
+        'by_month': list(
+            rollups.annotate(month=TruncMonth('day'))
+            .values('month').annotate(**totals_fields).order_by('-month')
+        ),
+        'recent_days': list(
+            rollups.filter(day__gte=since)
+            .values('day').annotate(**totals_fields).order_by('-day')
+        ),
+    }
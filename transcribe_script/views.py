@@ -1,6 +1,12 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
-from .models import Transcription
+from django.http import HttpResponse, StreamingHttpResponse, Http404, JsonResponse
+from django.core.paginator import Paginator
+from django.urls import reverse
+from .models import Transcription, TranscriptSegments
+from .segments import SegmentColumns, iter_srt, iter_vtt
+from .search import search_transcripts, result_snippet
+from .export import EXPORT_FORMATS, export_queryset, iter_transcripts_zip
+from .usage import usage_dashboard
 from .forms import TranscriptionForm
 from .transcription_service import process_transcription
 from django.contrib.auth.decorators import login_required
@@ -10,7 +16,7 @@ from django.contrib.auth import login
 from .models import UserProfile
 from .forms import UserProfileForm
 from django.contrib import messages
-from openai import OpenAI
+from django.conf import settings
 import threading
 
 def signup(request):
@@ -51,12 +57,13 @@ def upload_video(request):
             transcription.user = request.user  # Link to user
             transcription.save()
             
-            # Start transcription in background
-            thread = threading.Thread(
-                target=process_transcription,
-                args=(transcription,)
-            )
-            thread.start()
+            # Start transcription in background, unless a worker picks it up
+            if settings.TRANSCRIPTION_BACKGROUND == 'thread':
+                thread = threading.Thread(
+                    target=process_transcription,
+                    args=(transcription,)
+                )
+                thread.start()
             
             return redirect('transcription_status', pk=transcription.id)
     else:
@@ -66,6 +73,8 @@ def upload_video(request):
 
 def validate_openai_key(api_key):
     """Test if an OpenAI API key is valid"""
+    from openai import OpenAI  # Heavy import, only needed on this page
+
     try:
         client = OpenAI(api_key=api_key)
         # Make a minimal API call to test the key
@@ -110,17 +119,105 @@ def profile_settings(request):
 def transcription_status(request, pk):
     """Page showing transcription progress"""
     transcription = get_object_or_404(Transcription, pk=pk)
+    # Only ask whether cues exist; the segments row can be megabytes of text
+    has_subtitles = (
+        transcription.status == 'completed'
+        and TranscriptSegments.objects.filter(transcription=transcription).exclude(text='').exists()
+    )
     return render(request, 'transcribe_script/status.html', {
-        'transcription': transcription
+        'transcription': transcription,
+        'has_subtitles': has_subtitles,
     })
 
+@login_required
+def search(request):
+    """Full-text search over the user's transcripts, returned as ranked JSON
+
+    Each `snippet` is safe to insert as HTML: the transcript text is escaped
+    and the only tags are <mark> around matching words.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Missing search query'}, status=400)
+
+    paginator = Paginator(search_transcripts(request.user, query), 20)
+    page = paginator.get_page(request.GET.get('page'))
+
+    results = []
+    for transcription in page:
+        results.append({
+            'id': transcription.id,
+            'rank': float(transcription.rank),
+            'snippet': result_snippet(transcription, query),
+            'created_at': transcription.created_at.isoformat(),
+            'url': reverse('transcription_status', args=[transcription.id]),
+        })
+
+    return JsonResponse({
+        'query': query,
+        'page': page.number,
+        'num_pages': paginator.num_pages,
+        'count': paginator.count,
+        'results': results,
+    })
+
+@login_required
+def export_transcripts(request):
+    """Download all of the user's completed transcripts as one streamed zip
+
+    A large export can stream for minutes. gunicorn.conf.py uses threaded
+    workers, so it holds one thread, not a whole worker, and isn't cut off
+    by the worker timeout.
+    """
+    formats = [f for f in request.GET.get('formats', 'txt').split(',') if f in EXPORT_FORMATS]
+    if not formats:
+        return HttpResponse(
+            f"Unknown export format. Choose from: {', '.join(EXPORT_FORMATS)}",
+            status=400,
+            content_type='text/plain'
+        )
+
+    response = StreamingHttpResponse(
+        iter_transcripts_zip(export_queryset(request.user), formats),
+        content_type='application/zip'
+    )
+    response['Content-Disposition'] = 'attachment; filename="transcripts.zip"'
+    return response
+
+@login_required
+def usage(request):
+    """Audio minutes, tokens and estimated cost of the user's jobs"""
+    return render(request, 'transcribe_script/usage.html', usage_dashboard(request.user))
+
 def logout_view(request):
     """Log out the user"""
     logout(request)
     return redirect('login')
 
+SUBTITLE_FORMATS = {
+    'srt': (iter_srt, 'application/x-subrip'),
+    'vtt': (iter_vtt, 'text/vtt'),
+}
+
 def download_transcript(request, pk, transcript_type):
-    """Download a transcript as a text file"""
+    """Download a transcript as a text file, or as SRT/WebVTT subtitles"""
+    if transcript_type in SUBTITLE_FORMATS:
+        segments = get_object_or_404(TranscriptSegments, transcription_id=pk)
+        columns = SegmentColumns.from_fields(
+            segments.starts, segments.ends, segments.offsets, segments.text
+        )
+        if not len(columns):
+            raise Http404("No timestamped segments for this transcript")
+
+        render_subtitles, content_type = SUBTITLE_FORMATS[transcript_type]
+        response = StreamingHttpResponse(
+            render_subtitles(columns),
+            content_type=f'{content_type}; charset=utf-8'
+        )
+        filename = f"transcript_{pk}.{transcript_type}"
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
     transcription = get_object_or_404(Transcription, pk=pk)
     
     if transcript_type == 'raw':
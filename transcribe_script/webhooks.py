@@ -0,0 +1,182 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import random
+import socket
+import time
+from collections import defaultdict
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.utils import timezone
+
+from .models import WebhookEndpoint, WebhookEvent
+
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 30
+MAX_EVENTS_PER_DELIVERY = 100
+DELIVERY_TIMEOUT_SECONDS = 10
+SIGNATURE_HEADER = 'X-Transcribio-Signature'
+TIMESTAMP_HEADER = 'X-Transcribio-Timestamp'
+
+
+def sign_payload(secret, timestamp, body):
+    """HMAC-SHA256 over "<timestamp>.<body>", hex encoded"""
+    message = f"{timestamp}.".encode('utf-8') + body
+    return hmac.new(secret.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def check_webhook_url(url):
+    """Raise ValueError unless every address the URL's host resolves to is public
+
+    Called when an endpoint is registered and again before each delivery,
+    since DNS records can change in between.
+    """
+    if settings.WEBHOOK_ALLOW_PRIVATE_HOSTS:
+        return
+    parts = urlsplit(url)
+    if not parts.hostname:
+        raise ValueError("Webhook URL has no host")
+    try:
+        addresses = socket.getaddrinfo(parts.hostname, parts.port, proto=socket.IPPROTO_TCP)
+    except (socket.gaierror, UnicodeError):
+        raise ValueError(f"Could not resolve {parts.hostname}")
+
+    for _, _, _, _, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if (
+            address.is_loopback or address.is_private or address.is_link_local
+            or address.is_reserved or address.is_multicast or address.is_unspecified
+        ):
+            raise ValueError(f"{parts.hostname} resolves to a non-public address")
+
+
+def transcription_event_payload(transcription):
+    return {
+        'id': transcription.id,
+        'status': transcription.status,
+        'error_message': transcription.error_message,
+        'created_at': transcription.created_at,
+        'completed_at': transcription.completed_at,
+    }
+
+
+def enqueue_transcription_event(transcription):
+    """Queue a completed/failed event for each of the owner's active webhooks"""
+    if transcription.user_id is None:
+        return
+    endpoint_ids = WebhookEndpoint.objects.filter(
+        user_id=transcription.user_id, is_active=True
+    ).values_list('id', flat=True)
+
+    # Round-trip through JSON so datetimes are stored as strings
+    payload = json.loads(json.dumps(transcription_event_payload(transcription), cls=DjangoJSONEncoder))
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            endpoint_id=endpoint_id,
+            event=f"transcription.{transcription.status}",
+            payload=payload,
+        )
+        for endpoint_id in endpoint_ids
+    ])
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter: 30s, 1m, 2m, 4m, ..."""
+    delay = RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def deliver(session, endpoint, events):
+    """POST a batch of events to one endpoint; return an error message or None"""
+    import requests  # Only the dispatcher process needs it
+
+    body = json.dumps({
+        'events': [
+            {
+                'id': event.id,
+                'type': event.event,
+                'created_at': event.created_at,
+                'data': event.payload,
+            }
+            for event in events
+        ]
+    }, cls=DjangoJSONEncoder).encode('utf-8')
+    timestamp = str(int(time.time()))
+
+    try:
+        check_webhook_url(endpoint.url)
+    except ValueError as e:
+        return str(e)
+
+    try:
+        response = session.post(
+            endpoint.url,
+            data=body,
+            headers={
+                'Content-Type': 'application/json',
+                TIMESTAMP_HEADER: timestamp,
+                SIGNATURE_HEADER: f"sha256={sign_payload(endpoint.secret, timestamp, body)}",
+            },
+            timeout=DELIVERY_TIMEOUT_SECONDS,
+            allow_redirects=False,
+        )
+    except requests.RequestException as e:
+        return str(e)
+
+    if 200 <= response.status_code < 300:
+        return None
+    return f"HTTP {response.status_code}: {response.text[:500]}"
+
+
+def dispatch_due_events(session, limit=1000):
+    """Deliver due events, coalescing them into one request per endpoint
+
+    Returns (delivered, failed) event counts.
+    """
+    now = timezone.now()
+    due = list(
+        WebhookEvent.objects
+        .filter(delivered_at__isnull=True, next_attempt_at__lte=now, attempts__lt=MAX_ATTEMPTS)
+        .select_related('endpoint')
+        .order_by('next_attempt_at')[:limit]
+    )
+
+    by_endpoint = defaultdict(list)
+    for event in due:
+        by_endpoint[event.endpoint_id].append(event)
+
+    delivered = failed = 0
+    for events in by_endpoint.values():
+        endpoint = events[0].endpoint
+        for start in range(0, len(events), MAX_EVENTS_PER_DELIVERY):
+            batch = events[start:start + MAX_EVENTS_PER_DELIVERY]
+            ids = [event.id for event in batch]
+
+            if not endpoint.is_active:
+                error = "Endpoint disabled"
+            else:
+                error = deliver(session, endpoint, batch)
+
+            if error is None:
+                WebhookEvent.objects.filter(id__in=ids).update(
+                    delivered_at=timezone.now(), attempts=F('attempts') + 1, last_error=''
+                )
+                delivered += len(batch)
+                continue
+
+            # Events in a batch can have different attempt counts, so update each
+            for event in batch:
+                event.attempts += 1
+                event.last_error = error
+                event.next_attempt_at = timezone.now() + retry_delay(event.attempts)
+            WebhookEvent.objects.bulk_update(batch, ['attempts', 'last_error', 'next_attempt_at'])
+            failed += len(batch)
+
+    return delivered, failed
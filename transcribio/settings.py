@@ -9,8 +9,6 @@ import os
 from dotenv import load_dotenv
 import dj_database_url
 import environ
-import sys
-import smtplib
 
 # Load environment variables
 env = environ.Env()
@@ -139,15 +137,36 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-# Ensure media directories exist
-os.makedirs(MEDIA_ROOT, mode=0o755, exist_ok=True)
-for subdir in ['videos']:
-    os.makedirs(os.path.join(MEDIA_ROOT, subdir), mode=0o777, exist_ok=True)
-
 # File upload permissions
+# (media directories are created by the storage backend on first upload, not
+# at import time, so every worker process boots without touching the disk)
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
 
+# Longest upload we accept, in seconds (checked with ffprobe when installed)
+MAX_MEDIA_DURATION_SECONDS = int(os.environ.get('MAX_MEDIA_DURATION_SECONDS', str(4 * 60 * 60)))
+
+# How uploads are processed: 'thread' starts one thread per upload in the web
+# process, 'worker' leaves them pending for `manage.py run_transcription_worker`
+TRANSCRIPTION_BACKGROUND = os.environ.get('TRANSCRIPTION_BACKGROUND', 'thread')
+
+# Batch API: files accepted per request (Django caps multipart files at 100 by default)
+API_MAX_BATCH_FILES = int(os.environ.get('API_MAX_BATCH_FILES', '500'))
+DATA_UPLOAD_MAX_NUMBER_FILES = API_MAX_BATCH_FILES
+# Uncompressed bytes accepted from archives: per member and per request
+API_MAX_ARCHIVE_MEMBER_BYTES = int(os.environ.get('API_MAX_ARCHIVE_MEMBER_BYTES', str(2 * 1024 ** 3)))
+API_MAX_ARCHIVE_TOTAL_BYTES = int(os.environ.get('API_MAX_ARCHIVE_TOTAL_BYTES', str(10 * 1024 ** 3)))
+
+# Webhook URLs may not point at loopback/private/link-local addresses unless
+# this is set (only useful for local development)
+WEBHOOK_ALLOW_PRIVATE_HOSTS = os.environ.get('WEBHOOK_ALLOW_PRIVATE_HOSTS', 'False') == 'True'
+
+# Polish cache (LRU, number of transcript windows kept). Entries hold transcript
+# text but aren't linked to a user, so `manage.py sweep_media` also drops the
+# ones unused for POLISH_CACHE_TTL_DAYS
+POLISH_CACHE_MAX_ENTRIES = int(os.environ.get('POLISH_CACHE_MAX_ENTRIES', '10000'))
+POLISH_CACHE_TTL_DAYS = float(os.environ.get('POLISH_CACHE_TTL_DAYS', '30'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 